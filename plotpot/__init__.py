@@ -1,27 +1,19 @@
 # -*- coding: utf-8 -*-
 import sys
-from distutils.spawn import find_executable
+from importlib.util import find_spec
 
-# check if prerequisites are installed
+# check if prerequisites are installed, numpy and matplotlib are imported
+# by the sub-commands which need them
 try:
     from plotpot.__version__ import version
 except ImportError as error:
     print("Package not installed with pip.")
     sys.exit(error)
     
-try:
-    import numpy as np
-except ImportError as error:
+if find_spec("numpy") is None:
     print("Please install Python Numpy from http://numpy.scipy.org/")
-    sys.exit(error)
+    sys.exit("No module named 'numpy'")
     
-try:
-    import matplotlib.pyplot as plt
-except ImportError as error:
+if find_spec("matplotlib") is None:
     print("Please install Python Matplotlib from http://matplotlib.sourceforge.net/")
-    sys.exit(error)
-    
-convpot_program = find_executable("convpot")
-if not convpot_program:
-    print("Please install Convpot from https://github.com/ahpohl/convpot/")
-    sys.exit()
\ No newline at end of file
+    sys.exit("No module named 'matplotlib'")
@@ -18,6 +18,8 @@ def main():
     parser.add_argument('-V', '--version', action='version', version=version)
     parser.add_argument('-v', '--verbose', action='count',
                     help="be more verbose")
+    parser.add_argument('--profile', action='store_true',
+                    help="print time spent in queries and plotting")
 
     # create sub-command
     subparsers = parser.add_subparsers(title='available commands', metavar='',
@@ -56,10 +58,22 @@ def main():
                     help="export data, statistics and figures", dest="showExport")
     parser_show.add_argument('-f', '--force', action='store_true',
                     help="skip up-to-date check", dest="showForce")
+    parser_show.add_argument('--convpot', action='store_true',
+                    help="convert Gamry files with Convpot", dest="showConvpot")
+    parser_show.add_argument('-m', '--store', action='store_true',
+                    help="convert data into memory mapped store", dest="showStore")
+    parser_show.add_argument('--store-only', action='store_true', dest="showStoreOnly",
+                    help="keep data points of Gamry files only in the memory mapped store")
+    parser_show.add_argument('--float32', action='store_true', dest="showFloat32",
+                    help="keep voltage, current, dQ/dV and temperature in single precision")
     parser_show.add_argument('-p', '--plot', default='1', metavar='N',
                     help="select plot type", dest="showPlot")
     parser_show.add_argument('-s', '--smooth', type=int, choices=range(1,6), dest="showSmooth",
                     metavar='N', help="smooth dQ/dV plot [%(choices)s]") # window length
+    parser_show.add_argument('--full', action='store_true', dest="showFull",
+                    help="plot all data points of the time series")
+    parser_show.add_argument('-j', '--jobs', type=int, metavar='N', dest="showJobs",
+                    help="number of processes saving figures [number of cores]")
     
     # mutually exclusive arguments for plot command
     group_select = parser_show.add_mutually_exclusive_group()
@@ -80,6 +94,34 @@ def main():
                     dest='mergeList', help="text file with filenames")
     parser_merge.add_argument('-o', '--output', metavar='FN',
                     dest='mergeOutput', help="change output filename") 
+    parser_merge.add_argument('--convpot', action='store_true',
+                    dest='mergeConvpot', help="convert and merge files with Convpot")
+    
+    # create the parser for the "index" command
+    parser_index = subparsers.add_parser('index', help='create range indexes')
+    
+    parser_index.add_argument('indexFileNames', metavar='file', nargs='+',
+                    help="filenames of converted data")
+    parser_index.add_argument('-f', '--force', action='store_true',
+                    dest='indexForce', help="rebuild indexes")
+    
+    # create the parser for the "convert" command
+    parser_convert = subparsers.add_parser('convert', help='convert raw files in parallel')
+    
+    parser_convert.add_argument('convertFileNames', metavar='file', nargs='+',
+                    help="filenames of raw data")
+    parser_convert.add_argument('-j', '--jobs', type=int, metavar='N',
+                    dest='convertJobs', help="number of Convpot processes [number of cores]")
+    parser_convert.add_argument('-f', '--force', action='store_true',
+                    dest='convertForce', help="skip up-to-date check")
+    parser_convert.add_argument('--convpot', action='store_true',
+                    dest='convertConvpot', help="convert Gamry files with Convpot")
+    
+    # create the parser for the "info" command
+    parser_info = subparsers.add_parser('info', help='show information about converted files')
+    
+    parser_info.add_argument('infoFileNames', metavar='file', nargs='+',
+                    help="filenames of converted data")
     
     # create the parser for the "journal" command
     parser_journal = subparsers.add_parser('journal', help='display journal')
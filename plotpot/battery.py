@@ -7,32 +7,59 @@ import csv
 # own modules
 from plotpot.dbmanager import DbManager
 from plotpot.electrode import Electrode
+from plotpot.loader import Loader
+from plotpot.probe import Probe
 
 
 class Battery(DbManager):
     """A class for implementing an electrochemical device"""
     
+    # columns of Channel_Normal_Table for the battery data
+    dataColumns = {'points': 'Data_Point',
+                   'cycles': 'Full_Cycle',
+                   'stepIndex': 'Step_Index',
+                   'testTime': 'Test_Time',
+                   'stepTime': 'Step_Time',
+                   'dateTime': 'DateTime',
+                   'current': 'Current',
+                   'temperature': 'Aux_Channel'}
+    
     def __init__(self, args, globalArgs):
         self.args = args
         self.globalArgs = globalArgs
-        super().__init__(globalArgs['dataFileName'])
+        super().__init__(globalArgs['dataFileName'], readonly=True)
+        self.loader = Loader(globalArgs['dataFileName'], single=args.showFloat32)
+        
+        # convert data into memory mapped store, append new data points
+        # of a growing raw file to an existing store
+        if self.args.showStore:
+            self.loader.createStore()
+        elif self.loader.getStore().getIsAppended():
+            self.loader.updateStore()
+        
+        # set cycle limits and data range
+        self.setIsFullCell()
+        self.setStatCycles()
+        self.setStatPoints()
+        self.setHalfStatistics()
+        self.setRange()
     
         # set electrodes
-        self.setIsFullCell()
         self.setElectrodes()
         
-        # set data
-        self.setData()
-        
-        # set statistics
-        self.setStatistics()
-        self.setHalfStatistics()
+        # data and statistics are fetched on first access
+        for x in self.dataColumns:
+            setattr(self, x, None)
+        self.data = None
+        self.statTime = None
+        self.statAverageCurrent = None
+        self.statEfficiency = None
+        self.statistics = None
     
     
     def setIsFullCell(self):
         """test if voltage2 column is not zero"""
-        self.query('''SELECT Voltage2 FROM Channel_Normal_Table''')
-        self.isFullCell = np.any(np.array(self.fetchall()))
+        self.isFullCell = Probe(self.globalArgs['dataFileName']).getIsFullCell()
     
     
     def getIsFullCell(self):
@@ -40,16 +67,27 @@ class Battery(DbManager):
         return self.isFullCell
     
     
+    def setColumns(self, data):
+        """fetch battery and electrode data from raw file in a single scan,
+           data is a list of keys of the battery and electrode dataColumns"""
+        columns = [self.dataColumns[x] for x in data if x in self.dataColumns]
+        for e in [self.we, self.ce]:
+            if e:
+                columns += [e.dataColumns[e.electrode][x] for x in data 
+                            if x in e.dataColumns[e.electrode]]
+        self.loader.setColumns(columns)
+        
+        
     def setElectrodes(self):
         """create electode objects"""
         
         print("*** Working electrode ***")
-        self.we = Electrode(self.args, self.globalArgs, "working")
+        self.we = Electrode(self.args, self.globalArgs, self.loader, "working", self.isFullCell)
         self.ce = None
  
         if self.isFullCell:
             print("*** Counter electrode ***")
-            self.ce = Electrode(self.args, self.globalArgs, "counter")
+            self.ce = Electrode(self.args, self.globalArgs, self.loader, "counter", self.isFullCell)
           
             
     def getElectrodes(self):
@@ -72,8 +110,73 @@ class Battery(DbManager):
             fh.close()
         
     
+    def setRange(self):
+        """set full cycle, half cycle and data point range according to show
+           arguments cycles, time and points. Only the data points in range
+           are loaded, starting one point earlier for the capacity offset in
+           the circle plot. The export needs all data points."""
+        
+        # get indices of full cycle limits
+        if self.globalArgs['cycles'] is not None:
+            # convert cycles to zero based index
+            self.c = (self.globalArgs['cycles'][0]-1, self.globalArgs['cycles'][1])
+            # get indices of half cycle limits
+            # convert full cycles into half cycles (with zero based index)
+            self.h = ((2*(self.globalArgs['cycles'][0])-1)-1, 2*(self.globalArgs['cycles'][1]))
+            # get indices of data point limits
+            self.p = (self.statPoints[self.c[0]:self.c[1]].flatten()[0],
+                      self.statPoints[self.c[0]:self.c[1]].flatten()[-1])
+        
+        # get indices with --time argument
+        elif self.globalArgs['time'] is not None:
+            # get indices of data point limits
+            self.p = self.loader.getTimeIndex(self.globalArgs['time'])
+            # get indices of half cycle limits
+            self.h = np.searchsorted(self.halfStatPoints[:,1], self.p)
+            self.h[1] += 1 
+            # get indices of full cycle limits
+            self.c = np.searchsorted(self.statPoints[:,1], self.p)
+            self.c[1] += 1
+            
+        # get indices with --data argument
+        elif self.globalArgs['points'] is not None:
+            # get indices of data point limits
+            self.p = self.globalArgs['points']
+            # get indices of half cycle limits
+            self.h = np.searchsorted(self.halfStatPoints[:,1], self.p)
+            self.h[1] += 1 
+            # get indices of full cycle limits
+            self.c = np.searchsorted(self.statPoints[:,1], self.p)
+            self.c[1] += 1
+            
+        # no range argument given
+        else:
+            self.c = (0, len(self.statCycles))
+            self.h = (0, len(self.halfStatCycles))
+            self.p = (0, self.loader.getRows())
+        
+        # restrict loaded data to range
+        if self.args.showExport:
+            self.offset = 0
+            self.loader.setWindow(0, None)
+        else:
+            self.offset = max(self.p[0]-1, 0)
+            self.loader.setWindow(self.offset, self.p[1])
+    
+    
+    def getRange(self):
+        """return full cycle, half cycle and data point range"""
+        return self.c, self.h, self.p
+    
+    
+    def getOffset(self):
+        """return index of the first loaded data point"""
+        return self.offset
+        
+    
     def export(self):
         """export battery data, statistics, voltage profile and properties"""
+        self.setColumns(['capacity', 'voltage', 'dQdV'])
         self.exportData()
         self.exportVoltageProfile()
         self.exportStatistics()
@@ -83,9 +186,12 @@ class Battery(DbManager):
     ### battery data methods ###
     
     def setData(self):
-        """fetch battery data from raw file"""
+        """fetch battery data from raw file. The data dictionary holds views
+           of the loaded columns, the counter electrode data of a half cell
+           is a read-only view of a single zero."""
         
-        # fetch data
+        # fetch data in a single scan
+        self.setColumns(list(self.dataColumns) + list(Electrode.dataColumns['working']))
         self.setPoints()
         self.setCycles()
         self.setStepIndex()
@@ -95,27 +201,34 @@ class Battery(DbManager):
         self.setCurrent()
         self.setTemperature()
         
-        # assemble data numpy array including electrode data
+        # assemble data dictionary including electrode data
+        we = self.we.getData()
         if self.isFullCell:
-            self.data = np.concatenate([self.points, self.cycles, self.stepIndex, self.testTime,
-                                        self.stepTime, self.dateTime, self.temperature, self.current,
-                                        self.we.capacity, self.ce.capacity, self.we.voltage, self.ce.voltage,
-                                        self.we.energy, self.ce.energy, self.we.dqdv, self.ce.dqdv], axis=1)
+            ce = self.ce.getData()
         else:
-            zeroElements = np.zeros(self.points.shape)
-            self.data = np.concatenate([self.points, self.cycles, self.stepIndex, self.testTime,
-                                        self.stepTime, self.dateTime, self.temperature, self.current,
-                                        self.we.capacity, zeroElements, self.we.voltage, zeroElements,
-                                        self.we.energy, zeroElements, self.we.dqdv, zeroElements], axis=1)
+            ce = dict.fromkeys(we, np.broadcast_to(0.0, self.points.shape))
+        self.data = {'points': self.points,
+                     'cycles': self.cycles,
+                     'stepIndex': self.stepIndex,
+                     'testTime': self.testTime,
+                     'stepTime': self.stepTime,
+                     'dateTime': self.dateTime,
+                     'temperature': self.temperature,
+                     'current': self.current,
+                     'we': we,
+                     'ce': ce}
     
     
     def getData(self):
-        """return battery data"""
+        """return dictionary with battery data"""
+        if self.data is None:
+            self.setData()
         return self.data
     
 
     def exportData(self):
-        """write data to a csv file"""
+        """write data to a csv file, the rows are streamed from the store or
+           the raw file in blocks to keep the memory bounded"""
         header = ",".join(["point", "cycle", "step", "test time", "step time", "timestamp", "temperature", 
                            "current", "WE capacity", "CE capacity", "WE voltage", "CE voltage",
                            "WE energy", "CE energy", "WE dQdV", "CE dQdV"])+"\r\n"
@@ -123,12 +236,27 @@ class Battery(DbManager):
                             "mA", "mAh/g", "mAh/g", "V", "V",
                             "Wh/kg", "Wh/kg", "As/V", "As/V"])+"\r\n"
     
+        # electrode columns, counter electrode columns are zero for half cells
+        electrodes = [self.we, self.ce]
+        columns = ['Data_Point', 'Full_Cycle', 'Step_Index', 'Test_Time', 'Step_Time',
+                   'DateTime', 'Aux_Channel', 'Current']
+        for quantity in ['capacity', 'voltage', 'energy', 'dQdV']:
+            for e in electrodes:
+                columns.append(e.dataColumns[e.electrode][quantity] if e else '0')
+        
         with open(self.args.showFileName.split('.')[0]+'_data.csv', "wb") as fh:
             fh.write(header.encode('utf-8'))
-            np.savetxt(fh, self.data, delimiter=',', newline="\r\n", 
-                   fmt=['%d','%d','%d','%f','%f','%d','%f',
-                        '%f','%f','%f','%f','%f','%f',
-                        '%f','%f','%f'])
+            for block in self.loader.getBlocks(columns):
+                block[:,3] = block[:,3] / 3.6e3
+                block[:,7] = block[:,7] * 1e3
+                for i, e in enumerate(electrodes):
+                    if e:
+                        block[:,8+i] = e.convertCapacity(block[:,8+i])
+                        block[:,12+i] = e.convertEnergy(block[:,12+i])
+                np.savetxt(fh, block, delimiter=',', newline="\r\n", 
+                       fmt=['%d','%d','%d','%f','%f','%d','%f',
+                            '%f','%f','%f','%f','%f','%f',
+                            '%f','%f','%f'])
             fh.close()
    
 
@@ -150,14 +278,14 @@ class Battery(DbManager):
                                     "CE voltage", "WE dQ/dV",  "CE dQ/dV"])+"\r\n"
         header += ",".join(["mAh/g", "mAh/g", "V", "V", "As/V", "As/V"])+"\r\n"
         
-        # construct data array
+        # data columns, the array is assembled per half cycle
         if self.isFullCell:
-            data = np.concatenate([self.we.capacity, self.ce.capacity, self.we.voltage, self.ce.voltage,
-                                   self.we.dqdv, self.ce.dqdv], axis=1)
+            columns = [self.we.getCapacity(), self.ce.getCapacity(), self.we.getVoltage(),
+                       self.ce.getVoltage(), self.we.getDqDv(), self.ce.getDqDv()]
         else:
-            zeroElements = np.zeros(self.points.shape)
-            data = np.concatenate([self.we.capacity, zeroElements, self.we.voltage, zeroElements,
-                                   self.we.dqdv, zeroElements], axis=1)        
+            zeroElements = np.broadcast_to(0.0, self.we.getVoltage().shape)
+            columns = [self.we.getCapacity(), zeroElements, self.we.getVoltage(), zeroElements,
+                       self.we.getDqDv(), zeroElements]
         
         # loop over half cycles
         c = 0;
@@ -176,7 +304,8 @@ class Battery(DbManager):
             # save data
             with open(filename, "wb") as fh:
                 fh.write(header.encode('utf-8'))
-                np.savetxt(fh, data[a:b], delimiter=',', newline="\r\n", fmt='%f')
+                np.savetxt(fh, np.column_stack([x[a:b] for x in columns]), 
+                           delimiter=',', newline="\r\n", fmt='%f')
                 fh.close()
                 
         # create zip archive
@@ -196,89 +325,97 @@ class Battery(DbManager):
     
     def setPoints(self):
         """data points"""
-        self.query('''SELECT Data_Point FROM Channel_Normal_Table''')
-        self.points = np.array(self.fetchall())
+        self.points = self.loader.getColumn('Data_Point')
 
         
     def getPoints(self):
         """capacity"""
+        if self.points is None:
+            self.setPoints()
         return self.points
     
     
     def setCycles(self):
         """full cycles"""
-        self.query('''SELECT Full_Cycle FROM Channel_Normal_Table''')
-        self.cycles = np.array(self.fetchall())
+        self.cycles = self.loader.getColumn('Full_Cycle')
 
         
     def getCycles(self):
         """full cycles"""
+        if self.cycles is None:
+            self.setCycles()
         return self.cycles
     
     
     def setStepIndex(self):
         """step index"""
-        self.query('''SELECT Step_Index FROM Channel_Normal_Table''')
-        self.stepIndex = np.array(self.fetchall())
+        self.stepIndex = self.loader.getColumn('Step_Index')
 
         
     def getStepIndex(self):
         """full cycles"""
+        if self.stepIndex is None:
+            self.setStepIndex()
         return self.stepIndex
     
     
     def setTestTime(self):
         """test time in hours"""
-        self.query('''SELECT Test_Time FROM Channel_Normal_Table''')
-        self.testTime = np.array(self.fetchall()) / 3.6e3
+        self.testTime = self.loader.getColumn('Test_Time') / 3.6e3
     
     
     def getTestTime(self):
         """test time in hours"""
+        if self.testTime is None:
+            self.setTestTime()
         return self.testTime
 
 
     def setStepTime(self):
         """step time in seconds"""
-        self.query('''SELECT Step_Time FROM Channel_Normal_Table''')
-        self.stepTime = np.array(self.fetchall())
+        self.stepTime = self.loader.getColumn('Step_Time')
     
     
     def getStepTime(self):
         """step time in hours"""
+        if self.stepTime is None:
+            self.setStepTime()
         return self.stepTime
     
 
     def setDateTime(self):
         """time stamp in seconds since epoch"""
-        self.query('''SELECT DateTime FROM Channel_Normal_Table''')
-        self.dateTime = np.array(self.fetchall())
+        self.dateTime = self.loader.getColumn('DateTime')
     
     
     def getDateTime(self):
         """time stamp in seconds since epoch"""
+        if self.dateTime is None:
+            self.setDateTime()
         return self.dateTime
 
 
     def setCurrent(self):
         """current in mA"""
-        self.query('''SELECT Current FROM Channel_Normal_Table''')
-        self.current = np.array(self.fetchall()) * 1e3
+        self.current = self.loader.getColumn('Current') * 1e3
     
     
     def getCurrent(self):
         """test time in hours"""
+        if self.current is None:
+            self.setCurrent()
         return self.current
    
     
     def setTemperature(self):
         """Temperature in °C"""
-        self.query('''SELECT Aux_Channel FROM Channel_Normal_Table''')
-        self.temperature = np.array(self.fetchall())
+        self.temperature = self.loader.getColumn('Aux_Channel')
     
     
     def getTemperature(self):
         """Temperature in °C"""
+        if self.temperature is None:
+            self.setTemperature()
         return self.temperature
     
     
@@ -288,8 +425,6 @@ class Battery(DbManager):
         """fetch statistics from raw file"""
         
         # fetch statistics
-        self.setStatCycles()
-        self.setStatPoints()
         self.setStatTime()
         self.setStatAverageCurrent()
         self.setStatEfficiency()
@@ -302,54 +437,56 @@ class Battery(DbManager):
                      self.statTime,
                      self.statAverageCurrent,
                      self.statEfficiency,
-                     self.we.statSpecificCapacity,
-                     self.ce.statSpecificCapacity,
-                     self.we.statVolumetricCapacity,
-                     self.ce.statVolumetricCapacity,
-                     self.we.statSpecificEnergy,
-                     self.ce.statSpecificEnergy,
-                     self.we.statVolumetricEnergy,
-                     self.ce.statVolumetricEnergy,
-                     self.we.statSpecificCurrentDensity,
-                     self.ce.statSpecificCurrentDensity,
-                     self.we.statAreaCurrentDensity,
-                     self.ce.statAreaCurrentDensity,
-                     self.we.statCRate,
-                     self.ce.statCRate,
-                     self.we.statAverageVoltage,
-                     self.ce.statAverageVoltage,
-                     self.we.statHysteresis,
-                     self.ce.statHysteresis], axis=1)
+                     self.we.getStatSpecificCapacity(),
+                     self.ce.getStatSpecificCapacity(),
+                     self.we.getStatVolumetricCapacity(),
+                     self.ce.getStatVolumetricCapacity(),
+                     self.we.getStatSpecificEnergy(),
+                     self.ce.getStatSpecificEnergy(),
+                     self.we.getStatVolumetricEnergy(),
+                     self.ce.getStatVolumetricEnergy(),
+                     self.we.getStatSpecificCurrentDensity(),
+                     self.ce.getStatSpecificCurrentDensity(),
+                     self.we.getStatAreaCurrentDensity(),
+                     self.ce.getStatAreaCurrentDensity(),
+                     self.we.getStatCRate(),
+                     self.ce.getStatCRate(),
+                     self.we.getStatAverageVoltage(),
+                     self.ce.getStatAverageVoltage(),
+                     self.we.getStatHysteresis(),
+                     self.ce.getStatHysteresis()], axis=1)
         
         else:
-            zeroElements = np.zeros(self.statPoints.shape)
+            zeroElements = np.broadcast_to(0.0, self.statPoints.shape)
             self.statistics = np.concatenate(
                     [self.statCycles,
                      self.statPoints,
                      self.statTime,
                      self.statAverageCurrent,
                      self.statEfficiency,
-                     self.we.statSpecificCapacity,
+                     self.we.getStatSpecificCapacity(),
                      zeroElements,
-                     self.we.statVolumetricCapacity,
+                     self.we.getStatVolumetricCapacity(),
                      zeroElements,
-                     self.we.statSpecificEnergy,
+                     self.we.getStatSpecificEnergy(),
                      zeroElements,
-                     self.we.statVolumetricEnergy,
+                     self.we.getStatVolumetricEnergy(),
                      zeroElements,
-                     self.we.statSpecificCurrentDensity,
+                     self.we.getStatSpecificCurrentDensity(),
                      zeroElements,
-                     self.we.statAreaCurrentDensity,
+                     self.we.getStatAreaCurrentDensity(),
                      zeroElements,
-                     self.we.statCRate,
+                     self.we.getStatCRate(),
                      zeroElements,
-                     self.we.statAverageVoltage,
+                     self.we.getStatAverageVoltage(),
                      zeroElements,
-                     self.we.statHysteresis,
-                     np.zeros(self.statCycles.shape)], axis=1)
+                     self.we.getStatHysteresis(),
+                     np.broadcast_to(0.0, self.statCycles.shape)], axis=1)
         
     def getStatistics(self):
         """return battery statistics"""
+        if self.statistics is None:
+            self.setStatistics()
         return self.statistics
     
 
@@ -390,14 +527,13 @@ class Battery(DbManager):
     
         with open(self.args.showFileName.split('.')[0]+'_statistics.csv', "wb") as fh:
             fh.write(header.encode('utf-8'))
-            np.savetxt(fh, self.statistics, delimiter=',', newline="\r\n", fmt='%f')
+            np.savetxt(fh, self.getStatistics(), delimiter=',', newline="\r\n", fmt='%f')
             fh.close()
             
     
     def setStatCycles(self):
         """full cycle statistics"""
-        self.query('''SELECT Full_Cycle FROM Full_Cycle_Table''')
-        self.statCycles = np.array(self.fetchall())
+        self.statCycles = self.loader.getCycleTable()['Full_Cycle'][:,None]
 
         
     def getStatCycles(self):
@@ -407,8 +543,7 @@ class Battery(DbManager):
     
     def setStatPoints(self):
         """start and end data point of cycle"""
-        self.query('''SELECT Cycle_Start,Cycle_End FROM Full_Cycle_Table''')
-        self.statPoints = np.array(self.fetchall())
+        self.statPoints = self.loader.getLimits('Full_Cycle_Table')
 
         
     def getStatPoints(self):
@@ -418,34 +553,39 @@ class Battery(DbManager):
     
     def setStatTime(self):
         """charge and discharge time in hours"""
-        self.query('''SELECT Charge_Time,Discharge_Time FROM Full_Cycle_Table''')
-        self.statTime = np.array(self.fetchall()) / 3.6e3
+        table = self.loader.getCycleTable()
+        self.statTime = np.column_stack([table['Charge_Time'], table['Discharge_Time']]) / 3.6e3
 
         
     def getStatTime(self):
         """charge and discharge time in hours"""
+        if self.statTime is None:
+            self.setStatTime()
         return self.statTime
     
     
     def setStatAverageCurrent(self):
         """average current in mA"""
-        self.query('''SELECT Charge_Current,Discharge_Current FROM Full_Cycle_Table''')
-        self.statAverageCurrent = np.array(self.fetchall()) * 1e3       
+        table = self.loader.getCycleTable()
+        self.statAverageCurrent = np.column_stack([table['Charge_Current'], table['Discharge_Current']]) * 1e3       
         
     
     def getStatAverageCurrent(self):
         """average current in mA"""
+        if self.statAverageCurrent is None:
+            self.setStatAverageCurrent()
         return self.statAverageCurrent
     
     
     def setStatEfficiency(self):
         """coulombic efficiency in %"""
-        self.query('''SELECT Efficiency FROM Full_Cycle_Table''')
-        self.statEfficiency = np.array(self.fetchall()) * 100      
+        self.statEfficiency = self.loader.getCycleTable()['Efficiency'][:,None] * 100      
         
     
     def getStatEfficiency(self):
         """coulombic efficiency in %"""
+        if self.statEfficiency is None:
+            self.setStatEfficiency()
         return self.statEfficiency
     
     
@@ -482,8 +622,7 @@ class Battery(DbManager):
     
     def setHalfStatPoints(self):
         """start and end data point of half cycle"""
-        self.query('''SELECT Cycle_Start,Cycle_End FROM Half_Cycle_Table''')
-        self.halfStatPoints = np.array(self.fetchall())
+        self.halfStatPoints = self.loader.getLimits('Half_Cycle_Table')
     
     
     def getHalfStatPoints(self):
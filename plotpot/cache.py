@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import os, sys
+import hashlib
+import shutil
+import numpy as np
+
+
+class Cache(object):
+    """class for keeping columns of a data file as numpy files. An entry is
+       keyed on size, modification time and Global_Table of the data file,
+       the least recently used entries are evicted when the cache exceeds
+       its size limit."""
+
+    def __init__(self, db, globalTable):
+        self.setCachePath()
+        self.setCacheSize()
+        self.setKey(db, globalTable)
+
+
+    def setCachePath(self):
+        """create cache in home directory or path specified with
+           PLOTPOT_CACHE environment variable"""
+        self.cachePath = os.environ.get('PLOTPOT_CACHE')
+        if not self.cachePath:
+            home = os.getenv('USERPROFILE') or os.getenv('HOME')
+            self.cachePath = os.path.join(home, ".plotpot-cache")
+
+
+    def getCachePath(self):
+        """return cache path"""
+        return self.cachePath
+
+
+    def setCacheSize(self):
+        """size limit in MB from PLOTPOT_CACHE_SIZE environment variable,
+           zero disables the cache"""
+        try:
+            self.cacheSize = int(float(os.environ.get('PLOTPOT_CACHE_SIZE', 2048)) * 2**20)
+        except ValueError:
+            sys.exit("ERROR: PLOTPOT_CACHE_SIZE is not a number.")
+
+
+    def getCacheSize(self):
+        """return size limit in bytes"""
+        return self.cacheSize
+
+
+    def setKey(self, db, globalTable):
+        """key and directory of the cache entry"""
+        stat = os.stat(db)
+        fingerprint = repr((os.path.abspath(db), stat.st_size, stat.st_mtime_ns, globalTable))
+        self.key = hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+        self.entryPath = os.path.join(self.cachePath, self.key)
+
+
+    def getKey(self):
+        """return key of the cache entry"""
+        return self.key
+
+
+    def getColumnFile(self, column, dtype):
+        """return file name of column, each type is cached separately"""
+        return os.path.join(self.entryPath, "%s.%s.npy" % (column, np.dtype(dtype).name))
+
+
+    def getColumn(self, column, dtype):
+        """return memory mapped column or None if the column is not cached"""
+        if not self.cacheSize:
+            return None
+        try:
+            array = np.load(self.getColumnFile(column, dtype), mmap_mode='r')
+            # mark entry as recently used
+            os.utime(self.entryPath)
+        except (OSError, ValueError):
+            return None
+        return array
+
+
+    def setColumns(self, arrays):
+        """write columns into the cache and evict old entries"""
+        if not self.cacheSize:
+            return
+        try:
+            os.makedirs(self.entryPath, exist_ok=True)
+            for column, array in arrays.items():
+                path = self.getColumnFile(column, array.dtype)
+                # write to temporary file first, parallel runs may read the entry
+                tmp = "%s.%d.tmp" % (path, os.getpid())
+                with open(tmp, "wb") as fh:
+                    np.save(fh, array)
+                os.replace(tmp, path)
+            self.evict()
+        except OSError as e:
+            print("INFO: Could not write cache (%s)." % e)
+
+
+    def evict(self):
+        """remove least recently used entries until the cache fits its size limit"""
+        entries = []
+        for name in os.listdir(self.cachePath):
+            path = os.path.join(self.cachePath, name)
+            try:
+                size = sum(os.path.getsize(os.path.join(path, x)) for x in os.listdir(path))
+                entries.append((os.path.getmtime(path), size, path))
+            except OSError:
+                continue
+
+        total = sum(x[1] for x in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.cacheSize:
+                break
+            if path == self.entryPath:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
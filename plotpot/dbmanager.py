@@ -1,28 +1,153 @@
 # -*- coding: utf-8 -*-
+import os
+import time
+import atexit
 import sqlite3
+from contextlib import contextmanager
+from urllib.request import pathname2url
 
 class DbManager(object):
     """class for managing the sqlite databases"""
-    
-    def __init__(self, db):
-        self.conn = sqlite3.connect(db)
+
+    # shared connections, one per database file and open mode
+    connections = {}
+
+    # optional profiler recording queries and fetched rows
+    profiler = None
+
+    # memory map and page cache size of read-only connections in bytes
+    mmapSize = 1 << 30
+    cacheSize = 1 << 26
+
+    # seconds to wait for a lock held by another process and number of
+    # attempts to start a write transaction while the database is busy
+    busyTimeout = 30.0
+    busyRetries = 5
+
+    # number of rows converted to a numpy block at once
+    blockSize = 65536
+
+    def __init__(self, db, readonly=False):
+        self.conn = self.connect(db, readonly)
         self.cur = self.conn.cursor()
-        self.query("PRAGMA foreign_keys = 1")
+
+    @classmethod
+    def connect(cls, db, readonly=False):
+        """return the shared connection of a database, open it on first use.
+           Read-only connections still take shared locks, the file may be
+           written by a read-write connection or another process while they
+           are open. Read-write connections are in autocommit mode unless a
+           transaction is started explicitly."""
+        key = (os.path.abspath(db), readonly)
+        if key not in cls.connections:
+            if readonly:
+                uri = "file:%s?mode=ro" % pathname2url(key[0])
+                conn = sqlite3.connect(uri, uri=True, timeout=cls.busyTimeout)
+                conn.execute("PRAGMA mmap_size = %d" % cls.mmapSize)
+                conn.execute("PRAGMA cache_size = -%d" % (cls.cacheSize >> 10))
+            else:
+                conn = sqlite3.connect(key[0], timeout=cls.busyTimeout,
+                                       isolation_level=None)
+                conn.execute("PRAGMA foreign_keys = 1")
+            cls.connections[key] = conn
+        return cls.connections[key]
+
+    @classmethod
+    def disconnect(cls, db):
+        """close the shared connections of a database"""
+        path = os.path.abspath(db)
+        for key in [x for x in cls.connections if x[0] == path]:
+            cls.connections.pop(key).close()
+
+    @classmethod
+    def disconnectAll(cls):
+        """close all shared connections"""
+        for key in list(cls.connections):
+            cls.connections.pop(key).close()
+
+    def begin(self):
+        """start a write transaction. The write lock is taken immediately so
+           that the busy timeout applies, if the database is still locked
+           the attempt is repeated with increasing delay."""
+        for attempt in range(self.busyRetries):
+            try:
+                self.cur.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or attempt == self.busyRetries - 1:
+                    raise
+                time.sleep(0.1 * 2**attempt)
+
+    @contextmanager
+    def transaction(self):
+        """run the enclosed statements in a single transaction, commit on
+           success and roll back on error. Nested calls join the outer
+           transaction."""
+        if self.conn.in_transaction:
+            yield self
+            return
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.conn.rollback()
+            raise
+        else:
+            self.conn.commit()
 
     def query(self, arg, bind=()):
+        start = time.perf_counter()
         self.cur.execute(arg, bind)
-        self.conn.commit()
+        if self.profiler:
+            self.profiler.setQuery(self.cur, arg, time.perf_counter() - start)
         return self.cur
-    
+
     def querymany(self, arg, bind=()):
+        start = time.perf_counter()
         self.cur.executemany(arg, bind)
-        self.conn.commit()
+        if self.profiler:
+            self.profiler.setQuery(self.cur, arg, time.perf_counter() - start)
         return self.cur
-    
+
     def fetchall(self):
+        start = time.perf_counter()
         data = self.cur.fetchall()
+        if self.profiler:
+            self.profiler.setRows(self.cur, data, time.perf_counter() - start)
+        return data
+
+    def fetchmany(self, size):
+        start = time.perf_counter()
+        data = self.cur.fetchmany(size)
+        if self.profiler:
+            self.profiler.setRows(self.cur, data, time.perf_counter() - start)
         return data
-    
+
     def fetchone(self):
+        start = time.perf_counter()
         data = self.cur.fetchone()
-        return data
\ No newline at end of file
+        if self.profiler:
+            self.profiler.setRows(self.cur, data, time.perf_counter() - start)
+        return data
+
+    def fetchblocks(self, dtype, size=None):
+        """yield the rows of the last query as numpy arrays with at most
+           size rows, so that large result sets never materialize as a
+           single Python list"""
+        import numpy as np
+        size = size or self.blockSize
+        while True:
+            start = time.perf_counter()
+            data = self.cur.fetchmany(size)
+            if not data:
+                break
+            fetched = time.perf_counter()
+            block = np.array(data, dtype=dtype)
+            if self.profiler:
+                self.profiler.setBlock(self.cur, block, fetched - start,
+                                       time.perf_counter() - fetched)
+            yield block
+
+
+# close shared connections at exit
+atexit.register(DbManager.disconnectAll)
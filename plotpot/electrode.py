@@ -9,24 +9,68 @@ from plotpot.journal import Journal
 
 class Electrode(DbManager):
     
-    def __init__(self, args, globalArgs, electrode = "working"):
+    # columns of Channel_Normal_Table for each electrode
+    dataColumns = {'working': {'voltage': 'Voltage',
+                               'capacity': 'Capacity',
+                               'energy': 'Energy',
+                               'dQdV': 'dQdV'},
+                   'counter': {'voltage': 'Voltage2',
+                               'capacity': 'Capacity',
+                               'energy': 'Energy2',
+                               'dQdV': 'dQdV2'}}
+    
+    # columns of Full_Cycle_Table for each electrode
+    statColumns = {'working': {'capacity': ['Charge_Capacity', 'Discharge_Capacity'],
+                               'energy': ['Charge_Energy', 'Discharge_Energy'],
+                               'current': ['Charge_Current', 'Discharge_Current'],
+                               'voltage': ['Charge_Voltage', 'Discharge_Voltage'],
+                               'hysteresis': ['Hysteresis']},
+                   'counter': {'capacity': ['Charge_Capacity', 'Discharge_Capacity'],
+                               'energy': ['Charge_Energy2', 'Discharge_Energy2'],
+                               'current': ['Charge_Current', 'Discharge_Current'],
+                               'voltage': ['Charge_Voltage2', 'Discharge_Voltage2'],
+                               'hysteresis': ['Hysteresis2']}}
+    
+    # per cycle statistics in raw units
+    rawStatNames = ['statCapacity',
+                    'statEnergy',
+                    'statCurrent',
+                    'statAverageVoltage',
+                    'statHysteresis']
+    
+    # per cycle statistics converted with the electrode properties
+    statNames = ['statSpecificCapacity',
+                 'statVolumetricCapacity',
+                 'statSpecificEnergy',
+                 'statVolumetricEnergy',
+                 'statSpecificCurrentDensity',
+                 'statAreaCurrentDensity',
+                 'statCRate']
+    
+    def __init__(self, args, globalArgs, loader, electrode = "working", isFullCell = None):
         self.args = args
         self.globalArgs = globalArgs
+        self.loader = loader
         self.electrode = electrode
-        super().__init__(globalArgs['dataFileName'])
+        if electrode not in self.dataColumns:
+            sys.exit("ERROR: Unknown electrode %s" % electrode)
+        super().__init__(globalArgs['dataFileName'], readonly=True)
         
         # create journal object
-        self.journal = Journal(args, globalArgs, electrode)
+        self.journal = Journal(args, globalArgs, electrode, isFullCell)
+        
+        # raw data and statistics are fetched on first access
+        self.voltage = None
+        self.rawCapacity = None
+        self.rawEnergy = None
+        self.dqdv = None
+        for x in self.rawStatNames:
+            setattr(self, x, None)
+        self.invalidate()
         
         # set electrode properties
         self.setProperties()
         
-        # set electrode data
-        self.setData()
-        
-        # set electrode statistics
-        self.setStatistics()
-        
         
     ### property methods ###
     
@@ -61,6 +105,16 @@ class Electrode(DbManager):
         self.journal.updateBatProperties()
         
         
+    def invalidate(self):
+        """discard data and statistics converted with the electrode
+           properties, they are derived again from the raw data on next access"""
+        self.capacity = None
+        self.energy = None
+        self.data = None
+        for x in self.statNames:
+            setattr(self, x, None)
+        
+        
     def getProperties(self):
         """return list with electrode properties"""   
         return [self.mass,
@@ -100,6 +154,7 @@ class Electrode(DbManager):
     def setMass(self):
         """set electrode mass"""        
         self.mass = self.__Property(self.mass, "mass", "mg")
+        self.invalidate()
 
 
     def getMass(self):
@@ -110,6 +165,7 @@ class Electrode(DbManager):
     def setTheoCapacity(self):
         """set electrode capacity"""        
         self.theoCapacity = self.__Property(self.theoCapacity, "capacity", "mAh/g")
+        self.invalidate()
 
 
     def getTheoCapacity(self):
@@ -120,6 +176,7 @@ class Electrode(DbManager):
     def setArea(self):
         """set electrode area"""
         self.area = self.__Property(self.area, "area of the electrode", "cm²")
+        self.invalidate()
 
 
     def getArea(self):
@@ -130,6 +187,7 @@ class Electrode(DbManager):
     def setVolume(self):
         """set electode volume"""        
         self.volume = self.__Property(self.volume, "volume of electrode", "µL")
+        self.invalidate()
 
         
     def getVolume(self):
@@ -155,261 +213,259 @@ class Electrode(DbManager):
     def setData(self):
         """fetch data from raw file"""
         
-        # fetch data
-        self.setVoltage()
-        self.setCapacity()
-        self.setEnergy()
-        self.setDqDv()
-        
         # assemble data dictionary
-        self.data = {'voltage': self.voltage,
-                     'capacity': self.capacity,
-                     'energy': self.energy,
-                     'dQdV': self.dqdv}
+        self.data = {'voltage': self.getVoltage(),
+                     'capacity': self.getCapacity(),
+                     'energy': self.getEnergy(),
+                     'dQdV': self.getDqDv()}
     
     
     def getData(self):
         """return dictonary with electrode data"""
+        if self.data is None:
+            self.setData()
         return self.data
     
 
     def setVoltage(self):
         """voltage"""
-        if self.electrode == 'working':
-            self.query('''SELECT Voltage FROM Channel_Normal_Table''')
-        elif self.electrode == 'counter':
-            self.query('''SELECT Voltage2 FROM Channel_Normal_Table''')
-        else:
-            sys.exit("ERROR: Unknown electrode %s" % self.electrode)
-        self.voltage = np.array(self.fetchall())
+        self.voltage = self.loader.getColumn(self.dataColumns[self.electrode]['voltage'])
 
         
     def getVoltage(self):
         """voltage"""
+        if self.voltage is None:
+            self.setVoltage()
         return self.voltage
     
     
+    def setRawCapacity(self):
+        """capacity in As"""
+        self.rawCapacity = self.loader.getColumn(self.dataColumns[self.electrode]['capacity'])
+        
+        
+    def getRawCapacity(self):
+        """capacity in As"""
+        if self.rawCapacity is None:
+            self.setRawCapacity()
+        return self.rawCapacity
+    
+    
     def setCapacity(self):
         """capacity"""
-        self.query('''SELECT Capacity FROM Channel_Normal_Table''')
-        self.capacity = np.array(self.fetchall())
-        # convert capacity from As to mAh/g
-        if self.mass:
-            self.capacity = np.abs(self.capacity / (3.6e-3 * self.mass))
+        self.capacity = self.convertCapacity(self.getRawCapacity())
 
         
     def getCapacity(self):
         """capacity"""
+        if self.capacity is None:
+            self.setCapacity()
         return self.capacity
     
     
+    def convertCapacity(self, capacity):
+        """convert capacity from As to mAh/g"""
+        if self.mass:
+            capacity = np.abs(capacity / (3.6e-3 * self.mass))
+        return capacity
+    
+    
+    def setRawEnergy(self):
+        """energy in Ws"""
+        self.rawEnergy = self.loader.getColumn(self.dataColumns[self.electrode]['energy'])
+        
+        
+    def getRawEnergy(self):
+        """energy in Ws"""
+        if self.rawEnergy is None:
+            self.setRawEnergy()
+        return self.rawEnergy
+    
+    
     def setEnergy(self):
         """energy"""
-        if self.electrode == 'working':
-            self.query('''SELECT Energy FROM Channel_Normal_Table''')
-        elif self.electrode == 'counter':
-            self.query('''SELECT Energy2 FROM Channel_Normal_Table''')
-        else:
-            sys.exit("ERROR: Unknown electrode %s" % self.electrode)
-        self.energy = np.array(self.fetchall())
-        # convert energy from Ws to Wh/kg
-        if self.mass:
-            self.energy = np.abs(self.energy / (3.6e-3 * self.mass))
+        self.energy = self.convertEnergy(self.getRawEnergy())
 
         
     def getEnergy(self):
         """energy"""
+        if self.energy is None:
+            self.setEnergy()
         return self.energy
     
     
+    def convertEnergy(self, energy):
+        """convert energy from Ws to Wh/kg"""
+        if self.mass:
+            energy = np.abs(energy / (3.6e-3 * self.mass))
+        return energy
+    
+    
     def setDqDv(self):
         """dQdV"""
-        if self.electrode == 'working':
-            self.query('''SELECT dQdV FROM Channel_Normal_Table''')
-        elif self.electrode == 'counter':
-            self.query('''SELECT dQdV2 FROM Channel_Normal_Table''')
-        else:
-            sys.exit("ERROR: Unknown electrode %s" % self.electrode)
-        self.dqdv = np.array(self.fetchall())
+        self.dqdv = self.loader.getColumn(self.dataColumns[self.electrode]['dQdV'])
 
         
     def getDqDv(self):
         """dQdV"""
+        if self.dqdv is None:
+            self.setDqDv()
         return self.dqdv
     
     
     ### per cycle statistics methods ###
     
     def setStatistics(self):
-        """fetch statistics from raw file"""
+        """convert capacity, energy and current of all cycles with the
+           electrode properties in a single pass"""
         
-        # calculate full cycle statistics
-        self.setStatSpecificCapacity()
-        self.setStatVolumetricCapacity()
-        self.setStatSpecificEnergy()
-        self.setStatVolumetricEnergy()
-        self.setStatSpecificCurrentDensity()
-        self.setStatAreaCurrentDensity()
-        self.setStatCRate()
-        self.setStatAverageVoltage()
-        self.setStatHysteresis()
+        # raw values, unit factors and divisors of the converted statistics
+        # capacity [As] -> [mAh/g], [Ah/L]; energy [Ws] -> [Wh/kg], [Wh/L];
+        # current [A] -> [µA mg-1] = [mA g-1], [mA cm-1]
+        capacity = self.getStatCapacity()
+        energy = self.getStatEnergy()
+        current = self.getStatCurrent()
+        raw = np.stack([capacity, capacity, energy, energy, current, current])
+        factor = np.array([1, 1, 1, 1, 1e6, 1e3])
+        divisor = np.array([3.6e-3 * self.mass, 3.6e-3 * self.volume,
+                            3.6e-3 * self.mass, 3.6e-3 * self.volume,
+                            self.mass, self.area], dtype=float)
+        
+        # quantities without property stay in raw units
+        isSet = divisor != 0
+        divisor[~isSet] = 1
+        stat = raw * factor[:,None,None] / divisor[:,None,None]
+        np.abs(stat, out=stat, where=isSet[:,None,None])
+        
+        # the specific current density is zero without mass
+        if not self.mass:
+            stat[4] = 0
+            
+        (self.statSpecificCapacity, self.statVolumetricCapacity,
+         self.statSpecificEnergy, self.statVolumetricEnergy,
+         self.statSpecificCurrentDensity, self.statAreaCurrentDensity) = stat
+        
+        # calculate theoretical capacity
+        # C = m * Ctheo [mg * mAh/g = Ah *1e-6]
+        # calculate C-rate / t
+        # t = C / I [Ah / A = h]
+        if self.mass and self.theoCapacity:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                self.statCRate = np.abs(self.mass * self.theoCapacity * 1e-6 / current)
+        else:
+            self.statCRate = current
         
         
-    def getStatistics(self):
-        """return battery statistics"""
-        return self.statistics
+    def getCycleColumns(self, quantity):
+        """return charge and discharge columns of quantity from Full_Cycle_Table"""
+        table = self.loader.getCycleTable()
+        return np.column_stack([table[x] for x in self.statColumns[self.electrode][quantity]])
     
 
-    def setStatSpecificCapacity(self):
-        """specific capacity"""
-        self.query('''SELECT Charge_Capacity,Discharge_Capacity FROM Full_Cycle_Table''')
-        self.statSpecificCapacity = np.array(self.fetchall())
-        # convert capacity from As to mAh/g
-        if self.mass:
-            self.statSpecificCapacity = np.abs(self.statSpecificCapacity / (3.6e-3 * self.mass))
-
+    def setStatCapacity(self):
+        """charge and discharge capacity in As"""
+        self.statCapacity = self.getCycleColumns('capacity')
+        
+        
+    def getStatCapacity(self):
+        """charge and discharge capacity in As"""
+        if self.statCapacity is None:
+            self.setStatCapacity()
+        return self.statCapacity
+    
+    
+    def setStatEnergy(self):
+        """charge and discharge energy in Ws"""
+        self.statEnergy = self.getCycleColumns('energy')
+        
+        
+    def getStatEnergy(self):
+        """charge and discharge energy in Ws"""
+        if self.statEnergy is None:
+            self.setStatEnergy()
+        return self.statEnergy
+    
+    
+    def setStatCurrent(self):
+        """average charge and discharge current in A"""
+        self.statCurrent = self.getCycleColumns('current')
+        
+        
+    def getStatCurrent(self):
+        """average charge and discharge current in A"""
+        if self.statCurrent is None:
+            self.setStatCurrent()
+        return self.statCurrent
+    
         
     def getStatSpecificCapacity(self):
-        """specific capacity"""
+        """specific capacity in mAh/g"""
+        if self.statSpecificCapacity is None:
+            self.setStatistics()
         return self.statSpecificCapacity
     
     
-    def setStatVolumetricCapacity(self):
-        """volumetric capacity"""
-        self.query('''SELECT Charge_Capacity,Discharge_Capacity FROM Full_Cycle_Table''')
-        self.statVolumetricCapacity = np.array(self.fetchall())
-        # convert capacity from As to Ah/L
-        if self.volume:
-            self.statVolumetricCapacity = np.abs(self.statVolumetricCapacity / (3.6e-3 * self.volume))
-
-        
     def getStatVolumetricCapacity(self):
-        """volumetric capacity"""
+        """volumetric capacity in Ah/L"""
+        if self.statVolumetricCapacity is None:
+            self.setStatistics()
         return self.statVolumetricCapacity
     
-
-    def setStatSpecificEnergy(self):
-        """specific capacity"""
-        if self.electrode == 'working':
-            self.query('''SELECT Charge_Energy,Discharge_Energy FROM Full_Cycle_Table''')
-        elif self.electrode == 'counter':
-            self.query('''SELECT Charge_Energy2,Discharge_Energy2 FROM Full_Cycle_Table''')
-        else:
-            sys.exit("ERROR: Unknown electrode %s" % self.electrode)
-        self.statSpecificEnergy = np.array(self.fetchall())
-        # convert capacity from Ws to Wh/kg
-        if self.mass:
-            self.statSpecificEnergy = np.abs(self.statSpecificEnergy / (3.6e-3 * self.mass))
-
-        
+    
     def getStatSpecificEnergy(self):
-        """specific capacity"""
+        """specific energy in Wh/kg"""
+        if self.statSpecificEnergy is None:
+            self.setStatistics()
         return self.statSpecificEnergy
     
     
-    def setStatVolumetricEnergy(self):
-        """volumetric capacity"""
-        if self.electrode == 'working':
-            self.query('''SELECT Charge_Energy,Discharge_Energy FROM Full_Cycle_Table''')
-        elif self.electrode == 'counter':
-            self.query('''SELECT Charge_Energy2,Discharge_Energy2 FROM Full_Cycle_Table''')
-        else:
-            sys.exit("ERROR: Unknown electrode %s" % self.electrode)
-        self.statVolumetricEnergy = np.array(self.fetchall())
-        # convert capacity from Ws to Wh/L
-        if self.volume:
-            self.statVolumetricEnergy = np.abs(self.statVolumetricEnergy / (3.6e-3 * self.volume))
-
-        
     def getStatVolumetricEnergy(self):
-        """volumetric capacity"""
+        """volumetric energy in Wh/L"""
+        if self.statVolumetricEnergy is None:
+            self.setStatistics()
         return self.statVolumetricEnergy
     
-    
-    def setStatSpecificCurrentDensity(self):
-        """specific current density"""
-
-        # get average current in [µA]
-        self.query('''SELECT Charge_Current,Discharge_Current FROM Full_Cycle_Table''')
-        averageCurrent = np.array(self.fetchall()) * 1e6
-        
-        # calculate specific current density in [µA mg-1] = [mA g-1]
-        if self.mass:
-            self.statSpecificCurrentDensity = np.abs(averageCurrent / self.mass)
-        else:
-            self.statSpecificCurrentDensity = np.zeros(averageCurrent.shape)
-
             
     def getStatSpecificCurrentDensity(self):
-        """specific current density"""
+        """specific current density in mA/g"""
+        if self.statSpecificCurrentDensity is None:
+            self.setStatistics()
         return self.statSpecificCurrentDensity
     
-
-    def setStatAreaCurrentDensity(self):
-        """area current density"""
-
-        # get average current in [mA]
-        self.query('''SELECT Charge_Current,Discharge_Current FROM Full_Cycle_Table''')
-        self.statAreaCurrentDensity = np.array(self.fetchall()) * 1e3
-        
-        # calculate area current density in [mA cm-1]
-        if self.area:
-            self.statAreaCurrentDensity = np.abs(self.statAreaCurrentDensity / self.area)
-
             
     def getStatAreaCurrentDensity(self):
-        """area current density"""
-        return self.statSpecificCurrentDensity
-
-
-    def setStatCRate(self):
-        """C-rate"""
-
-        # get average current in [A]
-        self.query('''SELECT Charge_Current,Discharge_Current FROM Full_Cycle_Table''')
-        self.statCRate = np.array(self.fetchall())
-        
-        # calculate theoretical capacity
-        # C = m * Ctheo [mg * mAh/g = Ah *1e-6]
-        # calculate C-rate / t
-        # t = C / I [Ah / A = h]
-        if self.mass and self.theoCapacity:
-            with np.errstate(invalid='ignore', divide='ignore'):
-                self.statCRate = np.abs(self.mass * self.theoCapacity * 1e-6 / self.statCRate)
-            
+        """area current density in mA/cm²"""
+        if self.statAreaCurrentDensity is None:
+            self.setStatistics()
+        return self.statAreaCurrentDensity
+    
             
     def getStatCRate(self):
         """C-rate"""
+        if self.statCRate is None:
+            self.setStatistics()
         return self.statCRate
     
 
     def setStatAverageVoltage(self):
         """average voltage"""
-        if self.electrode == 'working':
-            self.query('''SELECT Charge_Voltage,Discharge_Voltage FROM Full_Cycle_Table''')
-        elif self.electrode == 'counter':
-            self.query('''SELECT Charge_Voltage2,Discharge_Voltage2 FROM Full_Cycle_Table''')
-        else:
-            sys.exit("ERROR: Unknown electrode %s" % self.electrode)
-        self.statAverageVoltage = np.array(self.fetchall())
+        self.statAverageVoltage = self.getCycleColumns('voltage')
         
             
     def getStatAverageVoltage(self):
         """average voltage"""
+        if self.statAverageVoltage is None:
+            self.setStatAverageVoltage()
         return self.statAverageVoltage    
 
 
     def setStatHysteresis(self):
         """voltage hysteresis"""
-        if self.electrode == 'working':
-            self.query('''SELECT Hysteresis FROM Full_Cycle_Table''')
-        elif self.electrode == 'counter':
-            self.query('''SELECT Hysteresis2 FROM Full_Cycle_Table''')
-        else:
-            sys.exit("ERROR: Unknown electrode %s" % self.electrode)
-        self.statHysteresis = np.abs(np.array(self.fetchall()))
+        self.statHysteresis = np.abs(self.getCycleColumns('hysteresis'))
         
             
     def getStatHysteresis(self):
         """voltage hysteresis"""
-        return self.statHysteresis
\ No newline at end of file
+        if self.statHysteresis is None:
+            self.setStatHysteresis()
+        return self.statHysteresis
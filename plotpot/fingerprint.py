@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import os
+import struct
+import hashlib
+import zlib
+
+# own modules
+from plotpot.dbmanager import DbManager
+
+
+class Fingerprint(object):
+    """class for the fingerprint of a raw data file, built from size,
+       modification time and a hash of the first and last block. The
+       fingerprint is stored in Global_Table of the converted file and its
+       checksum in the user version of the sqlite header, which is read
+       without opening the database."""
+
+    # size of the hashed head and tail blocks in bytes
+    blockSize = 1 << 16
+
+    # sqlite header and offset of the user version
+    sqliteHeader = b"SQLite format 3\x00"
+    userVersionOffset = 60
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.setFingerprint()
+
+
+    def setFingerprint(self):
+        """read size, modification time, head and tail of the raw file"""
+        stat = os.stat(self.fileName)
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime_ns
+        with open(self.fileName, 'rb') as fh:
+            self.head = hashlib.sha1(fh.read(self.blockSize)).hexdigest()
+            fh.seek(max(self.size - self.blockSize, 0))
+            self.tail = hashlib.sha1(fh.read(self.blockSize)).hexdigest()
+        self.fingerprint = "%d:%d:%s:%s" % (self.size, self.mtime, self.head, self.tail)
+
+
+    @classmethod
+    def getIsAppended(cls, old, new):
+        """return True if the raw file of fingerprint new grew from the raw
+           file of fingerprint old by appending data. Only files larger than
+           a block are compared, smaller files are converted quickly."""
+        try:
+            oldSize, oldMtime, oldHead, oldTail = old.split(':')
+            newSize, newMtime, newHead, newTail = new.split(':')
+        except (AttributeError, ValueError):
+            return False
+        return int(oldSize) >= cls.blockSize and int(newSize) > int(oldSize) and oldHead == newHead
+
+
+    def getFingerprint(self):
+        """return fingerprint string"""
+        return self.fingerprint
+
+
+    def getChecksum(self):
+        """return checksum of the fingerprint as signed 32 bit integer"""
+        checksum = zlib.crc32(self.fingerprint.encode('utf-8'))
+        return checksum - (1 << 32) if checksum >= (1 << 31) else checksum
+
+
+    def readChecksum(self, db):
+        """return checksum stored in the header of the sqlite file, zero if
+           the file has no fingerprint and None if it is not a database"""
+        try:
+            with open(db, 'rb') as fh:
+                header = fh.read(self.userVersionOffset + 4)
+        except OSError:
+            return None
+        if not header.startswith(self.sqliteHeader) or len(header) < self.userVersionOffset + 4:
+            return None
+        return struct.unpack('>i', header[self.userVersionOffset:])[0]
+
+
+    def getIsUpToDate(self, db):
+        """return True if the sqlite file was converted from the raw file
+           with the same fingerprint"""
+        return self.readChecksum(db) == self.getChecksum()
+
+
+    def writeFingerprint(self, db, checksum=True):
+        """store fingerprint in Global_Table and its checksum in the sqlite
+           header, without checksum the file is never up-to-date by header"""
+        bat = DbManager(db)
+        with bat.transaction():
+            bat.query('''PRAGMA table_info(Global_Table)''')
+            if 'Plotpot_Fingerprint' not in [x[1] for x in bat.fetchall()]:
+                bat.query('''ALTER TABLE Global_Table ADD COLUMN Plotpot_Fingerprint TEXT''')
+            bat.query('''UPDATE Global_Table SET Plotpot_Fingerprint = ?''', (self.fingerprint,))
+            bat.query('''PRAGMA user_version = {0}'''.format(self.getChecksum() if checksum else 0))
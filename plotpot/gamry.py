@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+import os
+import datetime
+import collections
+import sqlite3
+from itertools import islice
+import numpy as np
+
+# own modules
+from plotpot.dbmanager import DbManager
+from plotpot.fingerprint import Fingerprint
+from plotpot.loader import Loader
+from plotpot.store import Store
+
+
+class Gamry(object):
+    """class for reading Gamry .DTA files without Convpot. The CURVE table is
+       parsed in blocks of lines into numpy arrays, from which the data
+       columns, the cycle tables and the global information of the converted
+       file are derived. Half cycles are split at sign changes of the current.
+       The data columns are written into the sqlite file, the memory mapped
+       store or both. A file which grew since its conversion is parsed from
+       the first data point of the last converted full cycle and only the
+       rows from there on are replaced."""
+
+    # file extension and device name
+    extension = "DTA"
+    device = "Gamry Interface 1000"
+
+    # number of lines parsed at once
+    blockLines = 65536
+
+    # columns of the curve table, auxiliary channel and temperature are optional
+    curveColumns = {'T': 'Test_Time',
+                    'Vf': 'Voltage',
+                    'Im': 'Current',
+                    'Ach': 'Voltage2',
+                    'Temp': 'Aux_Channel'}
+
+    # schema of the converted file
+    schema = {'Channel_Normal_Table': [('Data_Point', 'INTEGER PRIMARY KEY'), ('Test_Time', 'DOUBLE'),
+                  ('Step_Time', 'DOUBLE'), ('DateTime', 'INTEGER'), ('Step_Index', 'INTEGER'),
+                  ('Cycle_Index', 'INTEGER'), ('Current', 'DOUBLE'), ('Voltage', 'DOUBLE'),
+                  ('Voltage2', 'DOUBLE'), ('Capacity', 'DOUBLE'), ('Energy', 'DOUBLE'),
+                  ('Energy2', 'DOUBLE'), ('dQdV', 'DOUBLE'), ('dQdV2', 'DOUBLE'),
+                  ('Aux_Channel', 'DOUBLE'), ('Full_Cycle', 'INTEGER'), ('Half_Cycle', 'INTEGER')],
+              'Full_Cycle_Table': [('Full_Cycle', 'INTEGER PRIMARY KEY'), ('Cycle_Start', 'INTEGER'),
+                  ('Cycle_End', 'INTEGER'), ('Charge_Time', 'DOUBLE'), ('Discharge_Time', 'DOUBLE'),
+                  ('Charge_Current', 'DOUBLE'), ('Discharge_Current', 'DOUBLE'), ('Efficiency', 'DOUBLE'),
+                  ('Charge_Capacity', 'DOUBLE'), ('Discharge_Capacity', 'DOUBLE'),
+                  ('Charge_Energy', 'DOUBLE'), ('Discharge_Energy', 'DOUBLE'),
+                  ('Charge_Energy2', 'DOUBLE'), ('Discharge_Energy2', 'DOUBLE'),
+                  ('Charge_Voltage', 'DOUBLE'), ('Discharge_Voltage', 'DOUBLE'),
+                  ('Charge_Voltage2', 'DOUBLE'), ('Discharge_Voltage2', 'DOUBLE'),
+                  ('Hysteresis', 'DOUBLE'), ('Hysteresis2', 'DOUBLE')],
+              'Half_Cycle_Table': [('Half_Cycle', 'INTEGER PRIMARY KEY'), ('Cycle_Start', 'INTEGER'),
+                  ('Cycle_End', 'INTEGER'), ('Step_Index', 'INTEGER')],
+              'Global_Table': [('File_Name', 'TEXT'), ('File_Size', 'INTEGER'), ('Data_Points', 'INTEGER'),
+                  ('DateTime', 'INTEGER'), ('Device', 'TEXT'), ('Mass', 'DOUBLE DEFAULT 0'),
+                  ('Capacity', 'DOUBLE DEFAULT 0'), ('Area', 'DOUBLE DEFAULT 0'),
+                  ('Volume', 'DOUBLE DEFAULT 0'), ('Loading', 'DOUBLE DEFAULT 0'),
+                  ('Plotpot_Full_Cell', 'INTEGER')],
+              'File_Table': [('File_ID', 'INTEGER PRIMARY KEY'), ('File_Name', 'TEXT'), ('Device', 'TEXT'),
+                  ('Plot_Type', 'TEXT'), ('File_Size', 'INTEGER'), ('Start_DateTime', 'INTEGER'),
+                  ('Data_Points', 'INTEGER'), ('Test_Time', 'DOUBLE'), ('Comment', 'TEXT')]}
+
+    def __init__(self, fileName, resume=0, halfCycle=0):
+        self.fileName = fileName
+        self.resume = resume
+        self.halfCycle = halfCycle
+        self.header = {}
+        self.notes = []
+        self.setCurve()
+        self.setColumns()
+        self.setCycleTables()
+
+
+    def setCurve(self):
+        """read header and stream the rows of the CURVE table in blocks"""
+        curve = None
+        with open(self.fileName, "r", encoding="latin-1") as fh:
+            for line in fh:
+                fields = line.rstrip("\r\n").split("\t")
+                if len(fields) < 2:
+                    continue
+                key, kind = fields[0], fields[1]
+                self.header[key] = fields[1:]
+
+                # notes are followed by the given number of lines
+                if kind == "NOTES":
+                    self.notes = [x.strip() for x in islice(fh, int(fields[2]))]
+
+                # tables are followed by names, units and rows
+                elif kind == "TABLE" and len(fields) > 2:
+                    rows = int(fields[2])
+                    names = next(fh).rstrip("\r\n").split("\t")
+                    next(fh)
+                    if key == "CURVE":
+                        curve = self.readCurve(fh, names)
+                        break
+                    for x in islice(fh, rows):
+                        pass
+
+        if curve is None:
+            raise ValueError("no CURVE table in %s" % self.fileName)
+        self.curve = curve
+
+
+    def readCurve(self, fh, names):
+        """parse rows of the curve table block by block and return dict of
+           columns. The rows are read up to the end of the table, the row
+           count of the header is not final in files of a running test."""
+        missing = [x for x in ['T', 'Vf', 'Im'] if x not in names]
+        if missing:
+            raise ValueError("column %s missing in %s" % (','.join(missing), self.fileName))
+        keys = [x for x in self.curveColumns if x in names]
+        usecols = [names.index(x) for x in keys]
+
+        # rows converted before are skipped without parsing
+        rows = (x for x in fh if x.startswith("\t"))
+        collections.deque(islice(rows, self.resume), maxlen=0)
+
+        blocks = []
+        while True:
+            lines = list(islice(rows, self.blockLines))
+            if not lines:
+                break
+            blocks.append(np.loadtxt(lines, delimiter="\t", usecols=usecols, ndmin=2))
+        data = np.concatenate(blocks) if blocks else np.empty((0, len(keys)))
+
+        curve = {self.curveColumns[x]: np.ascontiguousarray(data[:,i]) for i, x in enumerate(keys)}
+        for x in self.curveColumns.values():
+            curve.setdefault(x, np.zeros(len(data)))
+        return curve
+
+
+    def getCurve(self):
+        """return dict of columns read from the curve table"""
+        return self.curve
+
+
+    def getStartDateTime(self):
+        """return start of the test as unix timestamp, the date is written
+           day first by the Gamry software"""
+        try:
+            date = "%s %s" % (self.header['DATE'][1], self.header['TIME'][1])
+            return int(datetime.datetime.strptime(date, "%d/%m/%Y %H:%M:%S").timestamp())
+        except (KeyError, IndexError, ValueError):
+            return int(os.path.getmtime(self.fileName))
+
+
+    def getIsFullCell(self):
+        """return 1 if the voltage2 column is not zero, recorded in Global_Table
+           so that the cell type is known without scanning the data points"""
+        return int(self.columns['Voltage2'].any())
+
+
+    def getPlotType(self):
+        """return type of the experiment, e.g. CHARGE or DISCHARGE"""
+        tag = self.header.get('TAG', [""])[0]
+        return tag.split("_")[-1]
+
+
+    def integrate(self, y, time, starts, halfCycle):
+        """cumulative trapezoidal integral of y over time, restarted at the
+           first data point of each half cycle"""
+        total = np.zeros(len(y))
+        if len(y) > 1:
+            np.cumsum(0.5 * (y[1:] + y[:-1]) * np.diff(time), out=total[1:])
+        return total - total[starts][halfCycle]
+
+
+    def derive(self, capacity, voltage, starts):
+        """differential capacity dQ/dV, zero at the first point of a half
+           cycle and where the voltage does not change"""
+        dQdV = np.zeros(len(capacity))
+        dQ = np.diff(capacity)
+        dV = np.diff(voltage)
+        np.divide(dQ, dV, out=dQdV[1:], where=dV != 0)
+        dQdV[starts] = 0.0
+        return dQdV
+
+
+    def setColumns(self):
+        """derive the columns of Channel_Normal_Table from the curve. Data
+           points and half cycles of a resumed curve continue the converted
+           rows, the curve then starts with a full cycle."""
+        curve = self.curve
+        time = curve['Test_Time']
+        rows = len(time)
+
+        # step index is the sign of the current, rest points join the previous step
+        step = np.sign(curve['Current']).astype(np.int64)
+        nonzero = np.flatnonzero(step)
+        if len(nonzero):
+            fill = np.maximum.accumulate(np.where(step != 0, np.arange(rows), nonzero[0]))
+            step = step[fill]
+
+        # half cycles start where the step changes, two half cycles form a full cycle
+        starts = np.flatnonzero(np.diff(step, prepend=0) != 0) if rows else np.array([], dtype=np.int64)
+        halfCycle = np.cumsum(np.diff(step, prepend=0) != 0) - 1 if rows else np.array([], dtype=np.int64)
+        halfCycle += self.halfCycle
+
+        index = halfCycle - self.halfCycle
+        capacity = self.integrate(curve['Current'], time, starts, index)
+        energy = self.integrate(curve['Current'] * curve['Voltage'], time, starts, index)
+        energy2 = self.integrate(curve['Current'] * curve['Voltage2'], time, starts, index)
+
+        self.columns = {'Data_Point': np.arange(self.resume + 1, self.resume + rows + 1),
+                        'Test_Time': time,
+                        'Step_Time': time - time[starts][index] if rows else time,
+                        'DateTime': self.getStartDateTime() + time.astype(np.int64),
+                        'Step_Index': step,
+                        'Cycle_Index': halfCycle // 2,
+                        'Current': curve['Current'],
+                        'Voltage': curve['Voltage'],
+                        'Voltage2': curve['Voltage2'],
+                        'Capacity': capacity,
+                        'Energy': energy,
+                        'Energy2': energy2,
+                        'dQdV': self.derive(capacity, curve['Voltage'], starts),
+                        'dQdV2': self.derive(capacity, curve['Voltage2'], starts),
+                        'Aux_Channel': curve['Aux_Channel'],
+                        'Full_Cycle': halfCycle // 2,
+                        'Half_Cycle': halfCycle}
+        self.starts = starts
+
+
+    def getColumns(self):
+        """return dict of Channel_Normal_Table columns"""
+        return self.columns
+
+
+    def setCycleTables(self):
+        """half and full cycle tables with the statistics of each cycle"""
+        columns = self.columns
+        rows = len(columns['Data_Point'])
+        starts = self.starts
+        ends = np.append(starts[1:], rows).astype(np.int64)
+        last = ends - 1
+        step = columns['Step_Index'][starts]
+        halfCycles = len(starts)
+
+        self.halfCycleTable = {'Half_Cycle': np.arange(halfCycles) + self.halfCycle,
+                               'Cycle_Start': starts + self.resume,
+                               'Cycle_End': ends + self.resume,
+                               'Step_Index': step}
+
+        # statistics of each half cycle
+        time = columns['Test_Time'][last] - columns['Test_Time'][starts]
+        current = np.add.reduceat(columns['Current'], starts) / (ends - starts) if halfCycles else time
+        capacity = columns['Capacity'][last]
+        energy = columns['Energy'][last]
+        energy2 = columns['Energy2'][last]
+        voltage = np.divide(energy, capacity, out=np.zeros(halfCycles), where=capacity != 0)
+        voltage2 = np.divide(energy2, capacity, out=np.zeros(halfCycles), where=capacity != 0)
+
+        # half cycles are sorted into the charge and discharge columns of full cycles
+        fullCycles = (halfCycles + 1) // 2
+        fullCycle = np.arange(halfCycles) // 2
+        table = {x: np.zeros(fullCycles) for x, y in self.schema['Full_Cycle_Table']}
+        table['Full_Cycle'] = np.arange(fullCycles) + self.halfCycle // 2
+        table['Cycle_Start'] = starts[::2] + self.resume
+        table['Cycle_End'] = (ends[1::2] if halfCycles % 2 == 0 else np.append(ends[1::2], rows)) + self.resume
+        for name, mask in [('Charge', step > 0), ('Discharge', step < 0)]:
+            index = fullCycle[mask]
+            table[name+'_Time'][index] = time[mask]
+            table[name+'_Current'][index] = current[mask]
+            table[name+'_Capacity'][index] = capacity[mask]
+            table[name+'_Energy'][index] = energy[mask]
+            table[name+'_Energy2'][index] = energy2[mask]
+            table[name+'_Voltage'][index] = voltage[mask]
+            table[name+'_Voltage2'][index] = voltage2[mask]
+
+        # efficiency and hysteresis of complete cycles
+        charge = table['Charge_Capacity']
+        np.divide(-table['Discharge_Capacity'], charge, out=table['Efficiency'], where=charge != 0)
+        complete = (charge != 0) & (table['Discharge_Capacity'] != 0)
+        table['Hysteresis'] = np.where(complete, table['Charge_Voltage'] - table['Discharge_Voltage'], 0.0)
+        table['Hysteresis2'] = np.where(complete, table['Charge_Voltage2'] - table['Discharge_Voltage2'], 0.0)
+        self.fullCycleTable = table
+
+
+    def getCycleTables(self):
+        """return full and half cycle tables"""
+        return self.fullCycleTable, self.halfCycleTable
+
+
+    def insertRows(self, db, table, columns):
+        """insert columns into table block by block"""
+        names = [x for x, y in self.schema[table]]
+        query = '''INSERT INTO {0} ({1}) VALUES ({2})'''.format(table, ','.join(names), ','.join('?'*len(names)))
+        rows = len(columns[names[0]])
+        for start in range(0, rows, DbManager.blockSize):
+            block = [columns[x][start:start+DbManager.blockSize].tolist() for x in names]
+            db.querymany(query, zip(*block))
+
+
+    def writeDatabase(self, dataFileName, points=True):
+        """write the converted file with the schema used by Convpot. Without
+           points Channel_Normal_Table stays empty and the data points are
+           only kept in the memory mapped store."""
+        DbManager.disconnect(dataFileName)
+        if os.path.isfile(dataFileName):
+            os.remove(dataFileName)
+
+        rows = len(self.columns['Data_Point'])
+        fileName = os.path.basename(self.fileName)
+        fileSize = os.path.getsize(self.fileName)
+        startDateTime = self.getStartDateTime()
+        testTime = float(self.columns['Test_Time'][-1]) if rows else 0.0
+
+        db = DbManager(dataFileName)
+        with db.transaction():
+            for table, columns in self.schema.items():
+                db.query('''CREATE TABLE {0} ({1})'''.format(table, ', '.join(' '.join(x) for x in columns)))
+            if points:
+                self.insertRows(db, 'Channel_Normal_Table', self.columns)
+            self.insertRows(db, 'Full_Cycle_Table', self.fullCycleTable)
+            self.insertRows(db, 'Half_Cycle_Table', self.halfCycleTable)
+            db.query('''INSERT INTO Global_Table (File_Name,File_Size,Data_Points,DateTime,Device,
+                Plotpot_Full_Cell) VALUES (?,?,?,?,?,?)''', (fileName, fileSize, rows, startDateTime,
+                self.device, self.getIsFullCell()))
+            db.query('''INSERT INTO File_Table VALUES (1,?,?,?,?,?,?,?,?)''',
+                (fileName, self.device, self.getPlotType(), fileSize, startDateTime, rows,
+                 testTime, ' '.join(x for x in self.notes if x)))
+        DbManager.disconnect(dataFileName)
+
+
+    def writeStore(self, dataFileName, identity):
+        """write the data columns and cycle limits into the memory mapped
+           store of the converted file, identity as read from Global_Table"""
+        store = Store(dataFileName, identity)
+        store.invalidate()
+        rows = len(self.columns['Data_Point'])
+        for x, y in self.schema['Channel_Normal_Table']:
+            store.createColumn('Channel_Normal_Table', x, Loader.columnTypes.get(x, np.float64), rows)[:] = self.columns[x]
+        for table, columns in [('Full_Cycle_Table', self.fullCycleTable), ('Half_Cycle_Table', self.halfCycleTable)]:
+            for x in ['Cycle_Start', 'Cycle_End']:
+                store.createColumn(table, x, Loader.columnTypes[x], len(columns[x]))[:] = columns[x]
+        store.setManifest()
+
+
+    def appendDatabase(self, dataFileName, points=True, isFullCell=False):
+        """replace the rows of the converted file from the first resumed data
+           point and half cycle on, the data points only with points. The
+           converted rows before are of a full cell with isFullCell."""
+        rows = self.resume + len(self.columns['Data_Point'])
+        fileSize = os.path.getsize(self.fileName)
+        testTime = float(self.columns['Test_Time'][-1]) if len(self.columns['Test_Time']) else 0.0
+
+        db = DbManager(dataFileName)
+        with db.transaction():
+            if points:
+                db.query('''DELETE FROM Channel_Normal_Table WHERE Data_Point > ?''', (self.resume,))
+                self.insertRows(db, 'Channel_Normal_Table', self.columns)
+            db.query('''DELETE FROM Full_Cycle_Table WHERE Full_Cycle >= ?''', (self.halfCycle // 2,))
+            db.query('''DELETE FROM Half_Cycle_Table WHERE Half_Cycle >= ?''', (self.halfCycle,))
+            self.insertRows(db, 'Full_Cycle_Table', self.fullCycleTable)
+            self.insertRows(db, 'Half_Cycle_Table', self.halfCycleTable)
+            db.query('''UPDATE Global_Table SET File_Size = ?, Data_Points = ?, Plotpot_Full_Cell = ?''',
+                (fileSize, rows, int(isFullCell or self.getIsFullCell())))
+            db.query('''UPDATE File_Table SET File_Size = ?, Data_Points = ?, Test_Time = ?''',
+                (fileSize, rows, testTime))
+        DbManager.disconnect(dataFileName)
+
+
+    def appendStore(self, dataFileName, identity):
+        """grow the columns of the memory mapped store in place and replace
+           the rows from the first resumed data point on. Return False if a
+           column can not be resized."""
+        store = Store(dataFileName, identity)
+        tables = {'Full_Cycle_Table': (self.fullCycleTable, self.halfCycle // 2),
+                  'Half_Cycle_Table': (self.halfCycleTable, self.halfCycle)}
+        limits = {}
+        for table, (columns, keep) in tables.items():
+            for x in ['Cycle_Start', 'Cycle_End']:
+                old = store.getColumn(table, x)
+                if old is None or len(old) < keep:
+                    return False
+                limits[table, x] = np.concatenate([old[:keep], columns[x]])
+                del old
+        store.invalidate()
+        rows = identity[1]
+        for x, y in self.schema['Channel_Normal_Table']:
+            column = store.resizeColumn('Channel_Normal_Table', x, rows)
+            if column is None:
+                return False
+            column[self.resume:] = self.columns[x]
+            column.flush()
+            del column
+        for (table, x), limit in limits.items():
+            store.createColumn(table, x, Loader.columnTypes[x], len(limit))[:] = limit
+        store.setManifest()
+        return True
+
+
+    @classmethod
+    def getResume(cls, dataFileName, fingerprint):
+        """return the first data point and half cycle of the last converted
+           full cycle, the store identity of the converted file, whether its
+           data points are in sqlite and its cell type. None if the raw file
+           did not only grow or the converted file was not written by this
+           class."""
+        if not os.path.isfile(dataFileName):
+            return None
+        db = DbManager(dataFileName, readonly=True)
+        try:
+            db.query('''SELECT File_Size,Data_Points,Plotpot_Fingerprint,Device,Plotpot_Full_Cell
+                FROM Global_Table''')
+            fileSize, points, old, device, isFullCell = db.fetchone()
+            db.query('''SELECT MIN(Half_Cycle), MAX(Half_Cycle), COUNT(*) FROM Half_Cycle_Table''')
+            first, last, count = db.fetchone()
+            halfCycle = (count - 1) // 2 * 2
+            db.query('''SELECT Cycle_Start FROM Half_Cycle_Table WHERE Half_Cycle = ?''', (halfCycle,))
+            row = db.fetchone()
+            db.query('''SELECT MIN(Data_Point) FROM Channel_Normal_Table''')
+            firstPoint = db.fetchone()[0]
+            db.query('''SELECT MAX(Data_Point) FROM Channel_Normal_Table''')
+            lastPoint = db.fetchone()[0]
+        except (sqlite3.Error, TypeError):
+            return None
+        finally:
+            DbManager.disconnect(dataFileName)
+        if (device != cls.device or not count or first != 0 or last != count - 1 or not row
+                or not 0 < row[0] <= points or not Fingerprint.getIsAppended(old, fingerprint.getFingerprint())):
+            return None
+        return {'resume': row[0], 'halfCycle': halfCycle, 'identity': [fileSize, points, old],
+                'points': firstPoint == 1 and lastPoint == points, 'isFullCell': bool(isFullCell)}
+
+
+    @classmethod
+    def convert(cls, fileName, dataFileName, points=True, store=False, append=True):
+        """convert raw file and record its fingerprint. With store the data
+           columns are written into the memory mapped store, without points
+           they are not inserted into the sqlite file and its header gets no
+           checksum, so that the file is converted again when the data
+           points are needed in sqlite. A raw file which only grew is
+           appended to the sqlite file and the store as far as they hold the
+           data points already, unless append is False. Return True if the
+           file was appended."""
+        fingerprint = Fingerprint(fileName)
+        resume = cls.getResume(dataFileName, fingerprint) if append else None
+        if resume:
+            stored = Store(dataFileName, resume['identity']).getIsValid()
+            if resume['points'] or (stored and not points):
+                gamry = cls(fileName, resume['resume'], resume['halfCycle'])
+                identity = [os.path.getsize(fileName), resume['resume'] + len(gamry.columns['Data_Point']),
+                            fingerprint.getFingerprint()]
+                if not stored or gamry.appendStore(dataFileName, identity) or resume['points']:
+                    gamry.appendDatabase(dataFileName, resume['points'], resume['isFullCell'])
+                    fingerprint.writeFingerprint(dataFileName, checksum=resume['points'])
+                    DbManager.disconnect(dataFileName)
+                    return True
+
+        gamry = cls(fileName)
+        gamry.writeDatabase(dataFileName, points or not store)
+        fingerprint.writeFingerprint(dataFileName, checksum=points or not store)
+        if store:
+            gamry.writeStore(dataFileName, [os.path.getsize(fileName), len(gamry.columns['Data_Point']),
+                                            fingerprint.getFingerprint()])
+        DbManager.disconnect(dataFileName)
+        return False
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+# own modules
+from plotpot.dbmanager import DbManager
+
+
+class Index(DbManager):
+    """class for the range indexes of a converted data file. The version of
+       the indexes is recorded in the Plotpot_Index column of Global_Table,
+       the cell type in the Plotpot_Full_Cell column."""
+
+    # version of the indexes, increase if indexes are added
+    version = 1
+
+    # indexed columns of each table
+    indexColumns = {'Channel_Normal_Table': [['Data_Point'], ['Test_Time'], ['Full_Cycle']],
+                    'Full_Cycle_Table': [['Cycle_Start', 'Cycle_End']],
+                    'Half_Cycle_Table': [['Cycle_Start', 'Cycle_End']]}
+
+    def __init__(self, db):
+        super().__init__(db)
+        self.setIndexVersion()
+
+
+    def setIndexVersion(self):
+        """read version of the indexes from Global_Table, zero if the file
+           was never indexed"""
+        try:
+            self.query('''SELECT Plotpot_Index FROM Global_Table''')
+            self.indexVersion = self.fetchone()[0] or 0
+            self.hasIndexColumn = True
+        except sqlite3.OperationalError:
+            self.indexVersion = 0
+            self.hasIndexColumn = False
+
+
+    def getIndexVersion(self):
+        """return version of the indexes"""
+        return self.indexVersion
+
+
+    def getIsIndexed(self):
+        """return boolean if indexes are up-to-date"""
+        return self.indexVersion >= self.version
+
+
+    def getTableColumns(self, table):
+        """return column names and the integer primary key of table, which
+           is the rowid and needs no index"""
+        self.query('''PRAGMA table_info({0})'''.format(table))
+        info = self.fetchall()
+        columns = [x[1] for x in info]
+        rowid = [x[1] for x in info if x[5] and x[2].upper() == "INTEGER"]
+        return columns, rowid
+
+
+    def createIndexes(self, rebuild=False):
+        """create missing indexes, optionally rebuild existing ones and
+           record version in Global_Table"""
+        print("INFO: Creating indexes.")
+        with self.transaction():
+            for table, indexes in self.indexColumns.items():
+                columns, rowid = self.getTableColumns(table)
+                for index in indexes:
+                    if index == rowid or not set(index).issubset(columns):
+                        continue
+                    self.query('''CREATE INDEX IF NOT EXISTS {0}_{1} ON {0} ({2})'''.format(
+                            table, '_'.join(index), ','.join(index)))
+                if rebuild:
+                    self.query('''REINDEX {0}'''.format(table))
+            self.setIsFullCell()
+            if not self.hasIndexColumn:
+                self.query('''ALTER TABLE Global_Table ADD COLUMN Plotpot_Index INTEGER''')
+                self.hasIndexColumn = True
+            self.query('''UPDATE Global_Table SET Plotpot_Index = ?''', (self.version,))
+        self.indexVersion = self.version
+
+
+    def setIsFullCell(self):
+        """record if the voltage2 column is not zero, unless the cell type
+           was recorded at conversion. The scan stops at the first data point
+           of a full cell."""
+        self.query('''PRAGMA table_info(Global_Table)''')
+        if 'Plotpot_Full_Cell' not in [x[1] for x in self.fetchall()]:
+            self.query('''ALTER TABLE Global_Table ADD COLUMN Plotpot_Full_Cell INTEGER''')
+        else:
+            self.query('''SELECT Plotpot_Full_Cell FROM Global_Table''')
+            if self.fetchone()[0] is not None:
+                return
+        self.query('''SELECT EXISTS (SELECT 1 FROM Channel_Normal_Table WHERE Voltage2 != 0)''')
+        self.query('''UPDATE Global_Table SET Plotpot_Full_Cell = ?''', (self.fetchone()[0],))
@@ -2,32 +2,35 @@
 import os,sys
 import datetime
 import csv
-import numpy as np
 import sqlite3
 from operator import itemgetter
 from plotpot.dbmanager import DbManager
+from plotpot.probe import Probe
   
 
 class Journal(DbManager):
     """class for manipulating the journal"""
     
-    def __init__(self, args, globalArgs=None, electrode="working"):
+    def __init__(self, args, globalArgs=None, electrode="working", isFullCell=None):
         self.args = args
         self.globalArgs = globalArgs
         self.batElectrode = electrode
+        self.batIsFullCell = isFullCell
         self.setJournalPath()
         super().__init__(self.journalPath)
+        self.setJournalMode()
         self.createSchema()
         self.setJournal()
         self.setMergeFiles()
         
-        if self.args.subcommand == "show" or self.args.subcommand == "merge":
+        if self.args.subcommand in ("show", "merge", "convert"):
             self.bat = DbManager(self.globalArgs["dataFileName"])
             self.setBattery()
-            if not self.searchBatProperties():
-                self.insertBat()
-                if self.batFileCount > 1:
-                    self.copyBatteryFiles()
+            with self.transaction():
+                if not self.searchBatProperties():
+                    self.insertBat()
+                    if self.batFileCount > 1:
+                        self.copyBatteryFiles()
                     
                     
     ### internal methods ###
@@ -53,8 +56,7 @@ class Journal(DbManager):
         for i in data:
             lensData.append([len(str(x)) for x in i])
         lensData.append(lensHeader)
-        lensArray = np.array(lensData)
-        colWidths = np.amax(lensArray, axis=0) # get max in each column
+        colWidths = [max(x) for x in zip(*lensData)] # get max in each column
         
         formats = []
         for i in colWidths:
@@ -102,9 +104,23 @@ class Journal(DbManager):
         """return journal path"""
         return self.journalPath
     
+    
+    def setJournalMode(self):
+        """use write-ahead logging, so that readers and a writer of parallel
+           plotpot runs do not block each other"""
+        self.query('''PRAGMA journal_mode = WAL''')
+        self.query('''PRAGMA synchronous = NORMAL''')
+    
         
     def createSchema(self):
         # create schema
+        with self.transaction():
+            self.createJournalTable()
+            self.createMergeTable()
+        
+        
+    def createJournalTable(self):
+        """create journal table"""
         self.query('''CREATE TABLE IF NOT EXISTS Journal_Table (
             Row_ID INTEGER PRIMARY KEY AUTOINCREMENT,
             File_Name TEXT,
@@ -120,6 +136,9 @@ class Journal(DbManager):
             Loading DOUBLE DEFAULT 0,
             Electrode TEXT)''')
         
+        
+    def createMergeTable(self):
+        """create merge table"""
         self.query('''CREATE TABLE IF NOT EXISTS Merge_Table (
             Row_ID INTEGER PRIMARY KEY AUTOINCREMENT,
             Merge_ID INTEGER,
@@ -138,6 +157,13 @@ class Journal(DbManager):
     def upgradeSchema(self):
         """upgrade journal database schema"""
         
+        with self.transaction():
+            self.upgradeJournalTable()
+            
+            
+    def upgradeJournalTable(self):
+        """upgrade columns of journal table"""
+        
         # table upgrade: test if Global_Table exists ***
         self.query('''SELECT name FROM sqlite_master WHERE type="table" AND name="Global_Table" ''')
         resultSql = self.fetchone()
@@ -256,7 +282,8 @@ class Journal(DbManager):
         if data is None:
             print("INFO: Row ID %d does not exist." % self.args.journalDelete)
         else:
-            self.query(delete_query)
+            with self.transaction():
+                self.query(delete_query)
             print("INFO: Row ID %d deleted." % self.args.journalDelete)
             
 
@@ -582,13 +609,11 @@ class Journal(DbManager):
         select_query = '''SELECT {0} FROM File_Table'''.format(','.join(listOfVars[1:]))
         self.bat.query(select_query)
         filesTable = [list(x) for x in self.bat.fetchall()]
-        # fetch row id 
-        self.query('''SELECT max(row_ID) FROM Journal_Table''') 
-        row_id = self.fetchone()[0]
-        mergeTable = [[row_id]+x for x in filesTable]
+        mergeTable = [[self.batRowID]+x for x in filesTable]
         insert_query = '''INSERT INTO Merge_Table ({0}) VALUES ({1})'''.format(
                 (','.join(listOfVars)), ','.join('?'*len(listOfVars)))
-        self.querymany(insert_query, mergeTable)    
+        with self.transaction():
+            self.querymany(insert_query, mergeTable)
 
 
     def searchBatProperties(self):
@@ -616,29 +641,31 @@ class Journal(DbManager):
         """update properties in journal and battery"""
         
         # update journal
-        self.query('''
-            UPDATE Journal_Table 
-            SET Mass = {0}, Capacity = {1}, Area = {2}, Volume = {3}, Loading = {4}
-            WHERE File_Name = "{5}" AND Start_DateTime = {6} AND Electrode = "{7}"'''.format(
-                    self.mass, 
-                    self.theoCapacity,
-                    self.area,
-                    self.volume,
-                    self.loading,
-                    self.batFileName,
-                    self.batDate,
-                    self.batElectrode))
+        with self.transaction():
+            self.query('''
+                UPDATE Journal_Table 
+                SET Mass = {0}, Capacity = {1}, Area = {2}, Volume = {3}, Loading = {4}
+                WHERE File_Name = "{5}" AND Start_DateTime = {6} AND Electrode = "{7}"'''.format(
+                        self.mass, 
+                        self.theoCapacity,
+                        self.area,
+                        self.volume,
+                        self.loading,
+                        self.batFileName,
+                        self.batDate,
+                        self.batElectrode))
         
         # update battery
-        self.bat.query('''
-            UPDATE Global_Table 
-            SET Mass = {0}, Capacity = {1}, Area = {2}, Volume = {3}, Loading = {4}
-            WHERE rowid = 1'''.format(
-                    self.mass, 
-                    self.theoCapacity,
-                    self.area,
-                    self.volume,
-                    self.loading))
+        with self.bat.transaction():
+            self.bat.query('''
+                UPDATE Global_Table 
+                SET Mass = {0}, Capacity = {1}, Area = {2}, Volume = {3}, Loading = {4}
+                WHERE rowid = 1'''.format(
+                        self.mass, 
+                        self.theoCapacity,
+                        self.area,
+                        self.volume,
+                        self.loading))
         
 
     def insertBat(self):
@@ -648,7 +675,9 @@ class Journal(DbManager):
         insert_query = '''INSERT INTO Journal_Table ({0}) VALUES ({1})'''.format(
                 (','.join(listOfVars)), ','.join('?'*len(listOfVars)))
         
-        self.query(insert_query, self.battery)
+        with self.transaction():
+            self.query(insert_query, self.battery)
+            self.batRowID = self.cur.lastrowid
         #print("INFO: Created new record in journal file.")
 
 
@@ -697,6 +726,9 @@ class Journal(DbManager):
             
         elif self.args.subcommand == "merge":
            self.batFileName = self.globalArgs['dataFileName'] 
+           
+        elif self.args.subcommand == "convert":
+            self.batFileName = self.globalArgs['convertFileName']
             
     
     def getBatFileName(self):
@@ -716,14 +748,15 @@ class Journal(DbManager):
     
     
     def setBatIsFullCell(self):
-        """test if voltage2 column is not zero"""
-        self.bat.query('''SELECT Voltage2 FROM Channel_Normal_Table''')
-        self.batIsFullCell = np.any(np.array(self.bat.fetchall()))
+        """test if voltage2 column is not zero, unless the cell type was
+           given by the caller"""
+        if self.batIsFullCell is None:
+            self.batIsFullCell = Probe(self.globalArgs["dataFileName"]).getIsFullCell()
     
     
     def getBatIsFullCell(self):
         """return boolean if full or half cell"""
-        return self.isFullCell
+        return self.batIsFullCell
     
 
     def setBatDate(self):
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+import numpy as np
+
+# own modules
+from plotpot.dbmanager import DbManager
+from plotpot.cache import Cache
+from plotpot.store import Store
+from plotpot.probe import Probe
+
+
+class Loader(DbManager):
+    """class for loading columns of the converted data into numpy arrays"""
+
+    # compact numpy types of the integer columns, all other columns are float.
+    # The step index is signed in Half_Cycle_Table.
+    columnTypes = {'Data_Point': np.int32,
+                   'Full_Cycle': np.int32,
+                   'Half_Cycle': np.int32,
+                   'Step_Index': np.int16,
+                   'DateTime': np.int64,
+                   'Cycle_Start': np.int32,
+                   'Cycle_End': np.int32}
+
+    # columns kept in single precision in float32 mode
+    singleColumns = ['Voltage', 'Voltage2', 'Current', 'dQdV', 'dQdV2', 'Aux_Channel']
+
+    def __init__(self, db, single=False):
+        super().__init__(db, readonly=True)
+        self.single = single
+        self.columns = {}
+        self.windowColumns = {}
+        self.cycleTable = None
+        self.window = (0, None)
+        self.pointRange = None
+        self.setCache(db)
+        self.setStore(db)
+
+
+    def setCache(self, db):
+        """open array cache of the data file"""
+        self.query('''SELECT * FROM Global_Table''')
+        self.cache = Cache(db, self.fetchall())
+
+
+    def getColumnType(self, column):
+        """return numpy type of column"""
+        if self.single and column in self.singleColumns:
+            return np.float32
+        return self.columnTypes.get(column, np.float64)
+
+
+    def getCache(self):
+        """return array cache"""
+        return self.cache
+
+
+    def setStore(self, db):
+        """open memory mapped store of the data file, the store is valid as
+           long as size, data points and fingerprint of the raw file match"""
+        try:
+            self.query('''SELECT File_Size,Data_Points,Plotpot_Fingerprint FROM Global_Table''')
+        except sqlite3.OperationalError:
+            self.query('''SELECT File_Size,Data_Points FROM Global_Table''')
+        self.store = Store(db, list(self.fetchone()))
+        if not self.store.getIsValid():
+            Probe(db).checkPoints()
+
+
+    def getStore(self):
+        """return memory mapped store"""
+        return self.store
+
+
+    def createStore(self):
+        """convert all columns of Channel_Normal_Table and the cycle limits
+           into the memory mapped store"""
+        # data points kept only in the store can not be converted again
+        if self.store.getIsValid() and self.getPointRange()[0] is None:
+            return
+        print("INFO: Creating memory mapped store.")
+        self.store.invalidate()
+
+        # data columns, text columns are skipped
+        self.query('''PRAGMA table_info(Channel_Normal_Table)''')
+        columns = [x[1] for x in self.fetchall() if x[2].upper() not in ("TEXT", "BLOB")]
+        rows = self.getCount('Channel_Normal_Table')
+        self.fetchColumns('Channel_Normal_Table', {x: self.store.createColumn(
+                'Channel_Normal_Table', x, self.columnTypes.get(x, np.float64), rows) for x in columns})
+
+        # cycle limits
+        for table in ['Full_Cycle_Table', 'Half_Cycle_Table']:
+            rows = self.getCount(table)
+            self.fetchColumns(table, {x: self.store.createColumn(table, x, self.columnTypes[x], rows)
+                                      for x in ['Cycle_Start', 'Cycle_End']})
+
+        self.store.setManifest()
+        self.columns = {}
+        self.windowColumns = {}
+
+
+    def updateStore(self):
+        """append the data points added to the raw file to the memory mapped
+           store. The last half cycle of the store may have been incomplete
+           and is fetched again, the small cycle tables are rewritten."""
+        print("INFO: Updating memory mapped store.")
+        
+        # first data point of the last half cycle in the store
+        starts = self.store.getColumn('Half_Cycle_Table', 'Cycle_Start')
+        resume = min(int(starts[-1]) if starts is not None and len(starts) else 0,
+                     self.store.getManifestPoints())
+        del starts
+        self.store.invalidate()
+        
+        # grow columns and fetch new data points
+        self.query('''PRAGMA table_info(Channel_Normal_Table)''')
+        columns = [x[1] for x in self.fetchall() if x[2].upper() not in ("TEXT", "BLOB")]
+        rows = self.getCount('Channel_Normal_Table')
+        arrays = {x: self.store.resizeColumn('Channel_Normal_Table', x, rows) for x in columns}
+        if any(x is None for x in arrays.values()):
+            return self.createStore()
+        first, last = self.getPointRange()
+        if first is None or last - first + 1 != rows:
+            return self.createStore()
+        count = self.fetchColumns('Channel_Normal_Table', {x: arrays[x][resume:] for x in columns},
+                                  '''WHERE Data_Point >= ? ORDER BY Data_Point''', (first + resume,))
+        if count != rows - resume:
+            return self.createStore()
+        
+        # cycle limits
+        for table in ['Full_Cycle_Table', 'Half_Cycle_Table']:
+            rows = self.getCount(table)
+            self.fetchColumns(table, {x: self.store.createColumn(table, x, self.columnTypes[x], rows)
+                                      for x in ['Cycle_Start', 'Cycle_End']})
+        
+        self.store.setManifest()
+        self.columns = {}
+        self.windowColumns = {}
+        
+        
+    def getCount(self, table):
+        """return number of rows in table"""
+        self.query('''SELECT COUNT(*) FROM {0}'''.format(table))
+        return self.fetchone()[0]
+
+
+    def fetchColumns(self, table, arrays, where='', bind=()):
+        """fill the preallocated arrays with the columns of table in a single
+           scan, return the number of rows fetched"""
+        dtype = np.dtype([(x, arrays[x].dtype) for x in arrays])
+        self.query('''SELECT {0} FROM {1} {2}'''.format(','.join(arrays), table, where), bind)
+        start = 0
+        for block in self.fetchblocks(dtype):
+            end = start + len(block)
+            for x in arrays:
+                arrays[x][start:end] = block[x]
+            start = end
+        return start
+
+
+    def setColumns(self, columns):
+        """fetch all missing columns of Channel_Normal_Table in a single scan
+           into one structured buffer, the columns are views of its fields"""
+
+        # skip columns already loaded and duplicates
+        missing = [x for x in dict.fromkeys(columns) 
+                   if x not in self.columns and x not in self.windowColumns]
+
+        # memory map columns from store or cache
+        for x in missing:
+            if self.store.getIsValid():
+                array = self.store.getColumn('Channel_Normal_Table', x)
+            else:
+                array = self.cache.getColumn(x, self.getColumnType(x))
+            if array is not None:
+                self.columns[x] = array
+        missing = [x for x in missing if x not in self.columns]
+        if not missing:
+            return
+
+        # fetch only the data points of the window
+        if self.window != (0, None) and self.setWindowColumns(missing):
+            return
+
+        # allocate buffer and convert result set in blocks
+        rows = self.getCount('Channel_Normal_Table')
+        arrays = self.createBuffer(missing, rows)
+        self.fetchColumns('Channel_Normal_Table', arrays)
+
+        self.columns.update(arrays)
+        self.cache.setColumns(arrays)
+
+
+    def createBuffer(self, columns, rows):
+        """allocate a structured buffer for columns and return views of
+           its fields"""
+        buffer = np.empty(rows, dtype=[(x, self.getColumnType(x)) for x in columns])
+        return {x: buffer[x] for x in columns}
+
+
+    def setWindowColumns(self, columns):
+        """fetch the data points of the window with a bounded range on
+           Data_Point, offset by the first data point. The window columns are
+           not cached. Return False if the window covers all data points or
+           the data points are not consecutive."""
+        start, end = self.window
+        rows = self.getCount('Channel_Normal_Table')
+        if end is None or end > rows:
+            end = rows
+        
+        # all data points are loaded and cached
+        if start == 0 and end == rows:
+            return False
+        
+        # row positions map to data points only without gaps
+        first, last = self.getPointRange()
+        if first is None or last - first + 1 != rows:
+            print("INFO: Data points not consecutive, loading all data points.")
+            return False
+        
+        arrays = self.createBuffer(columns, end-start)
+        count = self.fetchColumns('Channel_Normal_Table', arrays,
+                                  '''WHERE Data_Point >= ? AND Data_Point < ? ORDER BY Data_Point''',
+                                  (int(first+start), int(first+end)))
+        if count != end-start:
+            print("INFO: Data points not consecutive, loading all data points.")
+            return False
+        self.windowColumns.update(arrays)
+        return True
+
+
+    def setPointRange(self):
+        """first and last Data_Point, each found by the primary key"""
+        self.query('''SELECT MIN(Data_Point) FROM Channel_Normal_Table''')
+        first = self.fetchone()[0]
+        self.query('''SELECT MAX(Data_Point) FROM Channel_Normal_Table''')
+        last = self.fetchone()[0]
+        self.pointRange = (first, last)
+
+
+    def getPointRange(self):
+        """return first and last Data_Point"""
+        if self.pointRange is None:
+            self.setPointRange()
+        return self.pointRange
+
+
+    def getColumn(self, column):
+        """return data points of the window from column of
+           Channel_Normal_Table, fetch the column if not loaded yet"""
+        if column not in self.columns and column not in self.windowColumns:
+            self.setColumns([column])
+        if column in self.windowColumns:
+            return self.windowColumns[column]
+        return self.columns[column][self.window[0]:self.window[1]]
+
+
+    def setWindow(self, start, end):
+        """restrict columns to the data points from start to end"""
+        if (start, end) != self.window:
+            self.windowColumns = {}
+        self.window = (start, end)
+
+
+    def getWindow(self):
+        """return first and last data point of the window"""
+        return self.window
+
+
+    def getRows(self):
+        """return number of data points"""
+        if self.store.getIsValid():
+            return len(self.store.getColumn('Channel_Normal_Table', 'Data_Point'))
+        return self.getCount('Channel_Normal_Table')
+
+
+    def getLimits(self, table):
+        """return start and end data point of each cycle in Full_Cycle_Table
+           or Half_Cycle_Table"""
+        if self.store.getIsValid():
+            return np.column_stack([self.store.getColumn(table, 'Cycle_Start'),
+                                    self.store.getColumn(table, 'Cycle_End')])
+        if table == 'Full_Cycle_Table':
+            cycles = self.getCycleTable()
+            return np.column_stack([cycles['Cycle_Start'], cycles['Cycle_End']])
+        self.query('''SELECT Cycle_Start,Cycle_End FROM {0}'''.format(table))
+        return np.array(self.fetchall(), dtype=self.columnTypes['Cycle_Start']).reshape(-1, 2)
+
+
+    def setCycleTable(self):
+        """fetch all columns of Full_Cycle_Table in a single query"""
+        self.query('''PRAGMA table_info(Full_Cycle_Table)''')
+        columns = [x[1] for x in self.fetchall() if x[2].upper() not in ("TEXT", "BLOB")]
+        dtype = np.dtype([(x, self.columnTypes.get(x, np.float64)) for x in columns])
+        self.query('''SELECT {0} FROM Full_Cycle_Table'''.format(','.join(columns)))
+        blocks = list(self.fetchblocks(dtype))
+        self.cycleTable = np.concatenate(blocks) if blocks else np.empty(0, dtype=dtype)
+
+
+    def getCycleTable(self):
+        """return Full_Cycle_Table as structured array, which is shared by
+           the battery and both electrodes"""
+        if self.cycleTable is None:
+            self.setCycleTable()
+        return self.cycleTable
+
+
+    def getBlocks(self, columns):
+        """yield blocks of rows of the columns of Channel_Normal_Table as two
+           dimensional float arrays, from the store if it is up-to-date and
+           otherwise streamed from sqlite. A column named '0' is zero."""
+        if not self.store.getIsValid():
+            self.query('''SELECT {0} FROM Channel_Normal_Table'''.format(','.join(columns)))
+            yield from self.fetchblocks(np.float64)
+            return
+        arrays = [None if x == '0' else self.store.getColumn('Channel_Normal_Table', x) for x in columns]
+        rows = self.getRows()
+        for start in range(0, rows, self.blockSize):
+            end = min(start + self.blockSize, rows)
+            block = np.zeros((end - start, len(columns)))
+            for i, x in enumerate(arrays):
+                if x is not None:
+                    block[:,i] = x[start:end]
+            yield block
+
+
+    def getTimeIndex(self, time):
+        """return indices of the data points at test time in hours, the
+           first data point at or after each time is looked up in sqlite
+           unless the test time column is memory mapped. Data points are
+           offset by the first data point."""
+        if 'Test_Time' not in self.columns and self.store.getIsValid():
+            self.columns['Test_Time'] = self.store.getColumn('Channel_Normal_Table', 'Test_Time')
+        if 'Test_Time' in self.columns:
+            return np.searchsorted(self.columns['Test_Time'], np.asarray(time) * 3.6e3)
+        
+        index = []
+        first = self.getPointRange()[0] or 0
+        for t in time:
+            self.query('''SELECT Data_Point FROM Channel_Normal_Table WHERE Test_Time >= ? 
+                    ORDER BY Test_Time,Data_Point LIMIT 1''', (t * 3.6e3,))
+            row = self.fetchone()
+            index.append(max(row[0]-first, 0) if row else self.getRows())
+        return np.array(index)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+import os, sys
+
+# own modules
+from plotpot.dbmanager import DbManager
+
+
+class Merge(DbManager):
+    """class for merging converted data files into one file. Each file is
+       attached in turn and its rows are copied with INSERT ... SELECT, data
+       points, test time and cycles are shifted by the totals of the previous
+       files. The full cycle table is rebuilt from the statistics of the half
+       cycles once all files are copied. The merged file is written under a
+       temporary name and renamed when complete."""
+
+    # columns of Channel_Normal_Table shifted by the previous files, two
+    # half cycles form a full cycle
+    shiftColumns = {'Data_Point': 'Data_Point + :points',
+                    'Test_Time': 'Test_Time + :time',
+                    'Half_Cycle': 'Half_Cycle + :half',
+                    'Full_Cycle': '(Half_Cycle + :half) / 2'}
+
+    # statistics of a half cycle, taken from the charge or discharge columns
+    # of the full cycle table
+    statColumns = ['Time', 'Current', 'Capacity', 'Energy', 'Energy2', 'Voltage', 'Voltage2']
+
+    def __init__(self, db, fileNames):
+        self.mergeFileName = db
+        self.tempFileName = db + '.tmp'
+        self.fileNames = fileNames
+        DbManager.disconnect(self.tempFileName)
+        if os.path.isfile(self.tempFileName):
+            os.remove(self.tempFileName)
+        super().__init__(self.tempFileName)
+        self.query('''PRAGMA journal_mode = OFF''')
+        self.query('''PRAGMA synchronous = OFF''')
+        self.offsets = {'points': 0, 'time': 0.0, 'half': 0, 'files': 0}
+        self.fileSize = 0
+        self.dateTime = None
+
+
+    def mergeFiles(self):
+        """copy all files, rebuild cycle table and move merged file in place"""
+        try:
+            for i, fileName in enumerate(self.fileNames):
+                self.query('''ATTACH DATABASE ? AS source''', (fileName,))
+                try:
+                    self.checkSource(fileName)
+                    if i == 0:
+                        self.createSchema()
+                    self.copyFile()
+                finally:
+                    self.query('''DETACH DATABASE source''')
+            self.createFullCycleTable()
+            self.createGlobalTable()
+        except BaseException:
+            DbManager.disconnect(self.tempFileName)
+            os.remove(self.tempFileName)
+            raise
+        DbManager.disconnect(self.tempFileName)
+        DbManager.disconnect(self.mergeFileName)
+        os.replace(self.tempFileName, self.mergeFileName)
+
+
+    def getColumns(self, table, schema='main'):
+        """return column names of table"""
+        self.query('''PRAGMA {0}.table_info({1})'''.format(schema, table))
+        return [x[1] for x in self.fetchall()]
+
+
+    def checkSource(self, fileName):
+        """stop if the cycles of the attached file are not numbered from zero
+           with two half cycles per full cycle, the statistics of the half
+           cycles and the shifted full cycles depend on it"""
+        self.query('''SELECT MIN(Half_Cycle), MAX(Half_Cycle), COUNT(*) FROM source.Half_Cycle_Table''')
+        first, last, count = self.fetchone()
+        self.query('''SELECT MIN(Full_Cycle), MAX(Full_Cycle), COUNT(*) FROM source.Full_Cycle_Table''')
+        firstFull, lastFull, countFull = self.fetchone()
+        self.query('''SELECT EXISTS (SELECT 1 FROM source.Channel_Normal_Table
+            WHERE Full_Cycle != Half_Cycle / 2)''')
+        mismatch = self.fetchone()[0]
+        if count and (first != 0 or last != count - 1 or firstFull != 0 or
+                      lastFull != countFull - 1 or lastFull != last // 2 or mismatch):
+            sys.exit("ERROR: Cycles of %s are not numbered from zero with two half "
+                     "cycles per full cycle, file can not be merged." % fileName)
+
+
+    def createSchema(self):
+        """create tables with the schema of the first file"""
+        self.query('''SELECT sql FROM source.sqlite_master WHERE type = "table" AND sql IS NOT NULL
+            AND name IN ("Channel_Normal_Table", "Full_Cycle_Table", "Half_Cycle_Table",
+                         "Global_Table", "File_Table")''')
+        tables = [x[0] for x in self.fetchall()]
+        with self.transaction():
+            for sql in tables:
+                self.query(sql)
+            self.query('''CREATE TEMP TABLE Half_Stat (Half_Cycle INTEGER, Cycle_Start INTEGER,
+                Cycle_End INTEGER, Step_Index INTEGER, {0})'''.format(
+                ', '.join(x+' DOUBLE' for x in self.statColumns)))
+
+
+    def copyFile(self):
+        """copy rows of the attached file and shift them by the offsets"""
+        with self.transaction():
+
+            # data points
+            columns = [x for x in self.getColumns('Channel_Normal_Table')
+                       if x in self.getColumns('Channel_Normal_Table', 'source')]
+            self.query('''INSERT INTO main.Channel_Normal_Table ({0}) SELECT {1}
+                FROM source.Channel_Normal_Table ORDER BY Data_Point'''.format(
+                ','.join(columns), ','.join(self.shiftColumns.get(x, x) for x in columns)),
+                self.offsets)
+
+            # half cycles and their statistics
+            self.query('''INSERT INTO main.Half_Cycle_Table (Half_Cycle,Cycle_Start,Cycle_End,Step_Index)
+                SELECT Half_Cycle + :half, Cycle_Start + :points, Cycle_End + :points, Step_Index
+                FROM source.Half_Cycle_Table ORDER BY Half_Cycle''', self.offsets)
+            stats = ["CASE WHEN h.Step_Index > 0 THEN f.Charge_{0} ELSE f.Discharge_{0} END".format(x)
+                     for x in self.statColumns]
+            self.query('''INSERT INTO temp.Half_Stat SELECT h.Half_Cycle + :half, h.Cycle_Start + :points,
+                h.Cycle_End + :points, h.Step_Index, {0} FROM source.Half_Cycle_Table h
+                LEFT JOIN source.Full_Cycle_Table f ON f.Full_Cycle = h.Half_Cycle / 2'''.format(
+                ','.join(stats)), self.offsets)
+
+            # raw files
+            self.query('''INSERT INTO main.File_Table (File_ID,File_Name,Device,Plot_Type,File_Size,
+                Start_DateTime,Data_Points,Test_Time,Comment) SELECT File_ID + :files,File_Name,Device,
+                Plot_Type,File_Size,Start_DateTime,Data_Points,Test_Time,Comment FROM source.File_Table
+                ORDER BY File_ID''', self.offsets)
+
+            # totals of the file
+            self.query('''SELECT File_Size, DateTime FROM source.Global_Table''')
+            fileSize, dateTime = self.fetchone()
+            self.query('''SELECT Data_Point, Test_Time FROM source.Channel_Normal_Table
+                ORDER BY Data_Point DESC LIMIT 1''')
+            points, time = self.fetchone() or (0, 0.0)
+            self.query('''SELECT COUNT(*) FROM source.Half_Cycle_Table''')
+            half = self.fetchone()[0]
+            self.query('''SELECT COUNT(*) FROM source.File_Table''')
+            files = self.fetchone()[0]
+
+        self.offsets['points'] += points
+        self.offsets['time'] += time
+        self.offsets['half'] += half
+        self.offsets['files'] += files
+        self.fileSize += fileSize or 0
+        if self.dateTime is None:
+            self.dateTime = dateTime
+
+
+    def createFullCycleTable(self):
+        """rebuild full cycle table from the half cycle statistics"""
+        charge = ["TOTAL(CASE WHEN Step_Index > 0 THEN {0} END) AS Charge_{0}".format(x)
+                  for x in self.statColumns]
+        discharge = ["TOTAL(CASE WHEN Step_Index < 0 THEN {0} END) AS Discharge_{0}".format(x)
+                     for x in self.statColumns]
+        names = [x.split(' AS ')[1] for x in charge + discharge]
+        with self.transaction():
+            self.query('''INSERT INTO Full_Cycle_Table (Full_Cycle,Cycle_Start,Cycle_End,{0},
+                Efficiency,Hysteresis,Hysteresis2)
+                SELECT Full_Cycle,Cycle_Start,Cycle_End,{0},
+                CASE WHEN Charge_Capacity != 0 THEN -Discharge_Capacity / Charge_Capacity ELSE 0 END,
+                CASE WHEN Charge_Capacity != 0 AND Discharge_Capacity != 0
+                    THEN Charge_Voltage - Discharge_Voltage ELSE 0 END,
+                CASE WHEN Charge_Capacity != 0 AND Discharge_Capacity != 0
+                    THEN Charge_Voltage2 - Discharge_Voltage2 ELSE 0 END
+                FROM (SELECT Half_Cycle / 2 AS Full_Cycle, MIN(Cycle_Start) AS Cycle_Start,
+                    MAX(Cycle_End) AS Cycle_End, {1} FROM temp.Half_Stat
+                    GROUP BY Half_Cycle / 2 ORDER BY Half_Cycle / 2)'''.format(
+                ','.join(names), ','.join(charge + discharge)))
+            self.query('''DROP TABLE temp.Half_Stat''')
+
+
+    def createGlobalTable(self):
+        """global information of the merged file"""
+        with self.transaction():
+            self.query('''INSERT INTO Global_Table (File_Name,File_Size,Data_Points,DateTime,Device)
+                VALUES (?,?,?,?,?)''', (os.path.basename(self.mergeFileName), self.fileSize,
+                                        self.offsets['points'], self.dateTime, "merged"))
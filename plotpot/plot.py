@@ -1,14 +1,60 @@
 # -*- coding: utf-8 -*-
-import sys, os
+import sys, os, gc
+import multiprocessing
+import concurrent.futures
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+
+# own modules
+from plotpot.snapshot import Snapshot
 
 
 class Plot(object):
+    
+    # battery and electrode data each plot depends on, the statistics
+    # plots 6-14 only need the cycle tables
+    plotData = {1: ['capacity', 'voltage'],
+                2: ['capacity', 'voltage'],
+                3: ['testTime', 'voltage', 'current'],
+                4: ['testTime', 'temperature'],
+                5: ['voltage', 'dQdV']}
+
+    # battery and electrode getters each plot depends on, copied for the
+    # worker processes which save the figures
+    plotGetters = {1: (['getHalfStatPoints'], ['getCapacity', 'getVoltage']),
+                   2: (['getHalfStatPoints', 'getHalfStatCycles'], ['getCapacity', 'getVoltage']),
+                   3: (['getTestTime', 'getCurrent'], ['getVoltage']),
+                   4: (['getTestTime', 'getTemperature'], []),
+                   5: (['getHalfStatPoints', 'getHalfStatStep'], ['getVoltage', 'getDqDv']),
+                   6: (['getStatCycles'], ['getStatSpecificCapacity']),
+                   7: (['getStatCycles'], ['getStatVolumetricCapacity']),
+                   8: (['getStatCycles'], ['getStatSpecificEnergy']),
+                   9: (['getStatCycles'], ['getStatVolumetricEnergy']),
+                   10: (['getStatCycles'], ['getStatSpecificCurrentDensity']),
+                   11: (['getStatCycles'], ['getStatAreaCurrentDensity']),
+                   12: (['getStatCycles'], ['getStatCRate']),
+                   13: (['getStatCycles'], ['getStatAverageVoltage', 'getStatHysteresis']),
+                   14: (['getStatCycles', 'getStatEfficiency'], [])}
 
     def __init__(self, args, bat):
         self.args = args
         self.bat = bat
+        self.isDrawn = False
+        self.hasData = False
+        
+    
+    def setData(self):
+        """set plot range and fetch data of all selected plots in a single scan"""
+        if self.hasData:
+            return
+        
+        # set plot range according to show arguments cycles, time and points
+        self.setPlotRange()
+        
+        # fetch data of all selected plots in a single scan
+        self.bat.setColumns([x for n in self.bat.globalArgs['plots'] for x in self.plotData.get(n, [])])
+        self.hasData = True
         
     
     def drawPlots(self):
@@ -17,44 +63,50 @@ class Plot(object):
         # set current working directory
         plt.rcParams['savefig.directory'] = os.getcwd()
         
-        # set plot range according to show arguments cycles, time and points
-        self.setPlotRange()
-        
+        self.setData()
         for n in self.bat.globalArgs['plots']:
-            if n == 1:
-                self.figVoltageCapacity()
-            elif n == 2:
-                self.figVoltageCapacityCircle()
-            elif n == 3:
-                self.figVoltageCurrent()
-            elif n == 4:
-                self.figTemperature()
-            elif n == 5:
-                self.figDQDV()
-            elif n == 6:
-                self.figSpecificCapacity()
-            elif n == 7:
-                self.figVolumetricCapacity()
-            elif n == 8:
-                self.figSpecificEnergy()
-            elif n == 9:
-                self.figVolumetricEnergy()
-            elif n == 10:
-                self.figSpecificCurrentDensity()
-            elif n == 11:
-                self.figAreaCurrentDensity()
-            elif n == 12:
-                self.figCRate()
-            elif n == 13:
-                self.figHysteresis()
-            elif n == 14:
-                self.figEfficiency()
-            else:
-                sys.exit("ERROR: Plot number not defined.")
+            self.drawFigure(n)
+        self.isDrawn = True
+        
+    
+    def drawFigure(self, n):
+        """call plotting function of figure n"""
+        if n == 1:
+            self.figVoltageCapacity()
+        elif n == 2:
+            self.figVoltageCapacityCircle()
+        elif n == 3:
+            self.figVoltageCurrent()
+        elif n == 4:
+            self.figTemperature()
+        elif n == 5:
+            self.figDQDV()
+        elif n == 6:
+            self.figSpecificCapacity()
+        elif n == 7:
+            self.figVolumetricCapacity()
+        elif n == 8:
+            self.figSpecificEnergy()
+        elif n == 9:
+            self.figVolumetricEnergy()
+        elif n == 10:
+            self.figSpecificCurrentDensity()
+        elif n == 11:
+            self.figAreaCurrentDensity()
+        elif n == 12:
+            self.figCRate()
+        elif n == 13:
+            self.figHysteresis()
+        elif n == 14:
+            self.figEfficiency()
+        else:
+            sys.exit("ERROR: Plot number not defined.")
         
 
     def savePlots(self):
-        """save plots into png images"""
+        """save plots into png images. With more than one plot the figures
+           are drawn again and saved by a pool of worker processes, one figure
+           per worker, otherwise the figures on screen are saved."""
 
         stem = self.args.showFileName.split('.')[0]
         ext = '.png'
@@ -73,10 +125,64 @@ class Plot(object):
                   12: '_efficiency',
                   13: '_hysteresis',
                   14: '_c_rate'}
-
+        
+        plots = self.bat.globalArgs['plots']
+        workers = min(len(plots), self.args.showJobs or os.cpu_count() or 1)
+        
+        if workers < 2:
+            if not self.isDrawn:
+                self.drawPlots()
+            for n in plots:
+                plt.figure(n)
+                plt.savefig(stem + suffix[n] + ext)
+            return
+        
+        # data is handed to the workers in shared memory
+        self.setData()
+        bat = self.getSnapshot()
+        try:
+            context = multiprocessing.get_context('spawn')
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = [pool.submit(Plot.saveFigure, self.args, bat, n, stem + suffix[n] + ext)
+                           for n in plots]
+                for future in futures:
+                    future.result()
+        finally:
+            bat.unlink()
+            
+    
+    def getSnapshot(self):
+        """return snapshot of the battery and electrode values of the
+           selected plots in shared memory"""
+        batGetters = ['getIsFullCell', 'getRange', 'getOffset']
+        electrodeGetters = []
         for n in self.bat.globalArgs['plots']:
-            plt.figure(n)
-            plt.savefig(stem + suffix[n] + ext)
+            batGetters += self.plotGetters[n][0]
+            electrodeGetters += self.plotGetters[n][1]
+        batGetters = list(dict.fromkeys(batGetters))
+        electrodeGetters = list(dict.fromkeys(electrodeGetters))
+        electrodes = [Snapshot(x, electrodeGetters) if x else None for x in self.bat.getElectrodes()]
+        bat = Snapshot(self.bat, batGetters, electrodes)
+        bat.share()
+        return bat
+    
+    
+    @staticmethod
+    def saveFigure(args, bat, n, fileName):
+        """draw figure n with the Agg backend and save it into a png image,
+           runs in a worker process on a battery snapshot"""
+        plt.switch_backend('Agg')
+        plot = Plot(args, bat)
+        plot.c, plot.h, plot.p = bat.getRange()
+        plot.offset = bat.getOffset()
+        plot.drawFigure(n)
+        plt.savefig(fileName)
+        
+        # figures hold references to the shared arrays
+        plt.close('all')
+        del plot
+        gc.collect()
+        bat.close()
            
     
     def showPlots(self):
@@ -87,45 +193,11 @@ class Plot(object):
     def setPlotRange(self):
         """set plot range according to show arguments cycles, time and points"""
         
-        # get indices of full cycle limits
-        if self.bat.globalArgs['cycles'] is not None:
-            # convert cycles to zero based index
-            self.c = (self.bat.globalArgs['cycles'][0]-1, self.bat.globalArgs['cycles'][1])
-            # get indices of half cycle limits
-            # convert full cycles into half cycles (with zero based index)
-            self.h = ((2*(self.bat.globalArgs['cycles'][0])-1)-1, 2*(self.bat.globalArgs['cycles'][1]))
-            #self.h = (2*self.c[0]-1, 2*self.c[1])
-            # get indices of data point limits
-            self.p = (self.bat.statPoints[self.c[0]:self.c[1]].flatten()[0],
-                      self.bat.statPoints[self.c[0]:self.c[1]].flatten()[-1])
-        
-        # get indices with --time argument
-        elif self.bat.globalArgs['time'] is not None:
-            # get indices of data point limits
-            self.p = np.searchsorted(self.bat.testTime[:,0], self.bat.globalArgs['time'])
-            # get indices of half cycle limits
-            self.h = np.searchsorted(self.bat.halfStatPoints[:,1], self.p)
-            self.h[1] += 1 
-            # get indices of full cycle limits
-            self.c = np.searchsorted(self.bat.statPoints[:,1], self.p)
-            self.c[1] += 1
-            
-        # get indices with --data argument
-        elif self.bat.globalArgs['points'] is not None:
-            # get indices of data point limits
-            self.p = self.bat.globalArgs['points']
-            # get indices of half cycle limits
-            self.h = np.searchsorted(self.bat.halfStatPoints[:,1], self.p)
-            self.h[1] += 1 
-            # get indices of full cycle limits
-            self.c = np.searchsorted(self.bat.statPoints[:,1], self.p)
-            self.c[1] += 1
-            
-        # no range argument given
-        else:
-            self.c = (0, len(self.bat.statCycles))
-            self.h = (0, len(self.bat.halfStatCycles))
-            self.p = (0, len(self.bat.points))
+        # get indices of full cycle, half cycle and data point limits
+        self.c, self.h, self.p = self.bat.getRange()
+        
+        # data arrays start at offset
+        self.offset = self.bat.getOffset()
             
         if self.args.verbose:
             print("Full cycles: %d-%d, Half cycles: %d-%d, Data Points: %d-%d" 
@@ -134,11 +206,42 @@ class Plot(object):
         
     ### data plot methods ###
     
+    def getHalfCycleLimits(self):
+        """start and end index of the selected half cycles in the data arrays,
+           clipped to the plot range"""
+        limits = np.array(self.bat.getHalfStatPoints()[self.h[0]:self.h[1]], dtype=np.int64).reshape(-1, 2)
+        limits[:,0] = np.maximum(limits[:,0], self.p[0])
+        limits[:,1] = np.minimum(limits[:,1], self.p[1])
+        return limits - self.offset
+    
+    
+    def addLines(self, ax, limits, x, y, xscale=1, xshift=0, yscale=1, level=0):
+        """add the half cycles given by limits as one line collection to the
+           axis. The points of all half cycles are gathered with one index array,
+           scale and shift of each half cycle are repeated over its points. With
+           level the half cycles are smoothed separately."""
+        lengths = np.maximum(limits[:,1] - limits[:,0], 0)
+        bounds = np.cumsum(lengths)
+        index = np.repeat(limits[:,0] - bounds + lengths, lengths) + np.arange(bounds[-1] if len(bounds) else 0)
+        x = x[index] * np.repeat(np.broadcast_to(xscale, lengths.shape), lengths) \
+            + np.repeat(np.broadcast_to(xshift, lengths.shape), lengths)
+        y = y[index] * np.repeat(np.broadcast_to(yscale, lengths.shape), lengths)
+        segments = np.split(np.column_stack((x, y)), bounds[:-1])
+        if level:
+            segments = [np.column_stack((self.smooth(z[:,0], window_len=level, window='hamming'),
+                                         self.smooth(z[:,1], window_len=level, window='hamming')))
+                        for z in segments]
+        ax.add_collection(LineCollection(segments, colors='k', capstyle='projecting'))
+        ax.autoscale_view()
+    
+    
     def figVoltageCapacity(self):
         """plot galvanostatic profile"""
 
+        limits = self.getHalfCycleLimits()
+        
         # half cell
-        if not self.bat.isFullCell:
+        if not self.bat.getIsFullCell():
             fig = plt.figure(1, figsize=(9,6))
             fig.canvas.set_window_title("Figure 1 - galvanostatic profile")
             
@@ -148,11 +251,8 @@ class Plot(object):
             ax1.set_xlabel('Specific capacity [mAh g$^{-1}$]', fontsize=12)
             ax1.set_ylabel('Voltage [V]', fontsize=12)
             
-            # loop over half cycles
-            for (a,b) in self.bat.halfStatPoints[self.h[0]:self.h[1]]:
-                if a < self.p[0]: a = self.p[0]
-                if b > self.p[1]: b = self.p[1]
-                ax1.plot(self.bat.we.capacity[a:b], self.bat.we.voltage[a:b], 'k-')
+            # all half cycles
+            self.addLines(ax1, limits, self.bat.we.getCapacity(), self.bat.we.getVoltage())
     
         # full cell
         else:
@@ -171,12 +271,9 @@ class Plot(object):
             ax2.set_xlabel('Specific capacity [mAh g$^{-1}$]', fontsize=12)
             ax2.set_ylabel('CE potential [V]', fontsize=12)
         
-             # loop over half cycles
-            for (a,b) in self.bat.halfStatPoints[self.h[0]:self.h[1]]:
-                if a < self.p[0]: a = self.p[0]
-                if b > self.p[1]: b = self.p[1]
-                ax1.plot(self.bat.we.capacity[a:b], self.bat.we.voltage[a:b], 'k-')
-                ax2.plot(self.bat.ce.capacity[a:b], self.bat.ce.voltage[a:b], 'k-')                
+            # all half cycles
+            self.addLines(ax1, limits, self.bat.we.getCapacity(), self.bat.we.getVoltage())
+            self.addLines(ax2, limits, self.bat.ce.getCapacity(), self.bat.ce.getVoltage())
 
         fig.tight_layout()
         
@@ -184,8 +281,18 @@ class Plot(object):
     def figVoltageCapacityCircle(self):
         """plot galvanostatic profile (circle)"""
         
+        # odd half cycles run backwards from the end capacity of the previous
+        # half cycle
+        limits = self.getHalfCycleLimits()
+        odd = self.bat.getHalfStatCycles()[self.h[0]:self.h[1]].ravel() % 2 == 1
+        scale = np.where(odd, -1, 1)
+        
+        def shift(capacity):
+            """end capacity of the previous half cycle for odd half cycles"""
+            return np.where(odd, np.r_[0, capacity[limits[:-1,1]-1]], 0)
+        
         # half cell
-        if not self.bat.isFullCell:
+        if not self.bat.getIsFullCell():
             fig = plt.figure(2, figsize=(9,6))
             fig.canvas.set_window_title("Figure 2 - galvanostatic profile (circle)")
             
@@ -195,17 +302,9 @@ class Plot(object):
             ax1.set_xlabel('Specific capacity [mAh g$^{-1}$]', fontsize=12)
             ax1.set_ylabel('Voltage [V]', fontsize=12)
             
-            # loop over half cycles
-            curCap = 0; prevCap = 0
-            for ((a,b),h) in zip(self.bat.halfStatPoints[self.h[0]:self.h[1]], self.bat.halfStatCycles[self.h[0]:self.h[1]]):
-                if a < self.p[0]: a = self.p[0]
-                if b > self.p[1]: b = self.p[1]
-                curCap = self.bat.we.capacity[b-1]
-                if h % 2 == 0:
-                    ax1.plot(self.bat.we.capacity[a:b], self.bat.we.voltage[a:b], 'k-')
-                else:
-                    ax1.plot(-1*self.bat.we.capacity[a:b]+prevCap, self.bat.we.voltage[a:b], 'k-')
-                prevCap = curCap
+            # all half cycles
+            self.addLines(ax1, limits, self.bat.we.getCapacity(), self.bat.we.getVoltage(),
+                          xscale=scale, xshift=shift(self.bat.we.getCapacity()))
                 
         # full cell
         else:
@@ -224,20 +323,11 @@ class Plot(object):
             ax2.set_xlabel('Specific capacity [mAh g$^{-1}$]', fontsize=12)
             ax2.set_ylabel('CE potential [V]', fontsize=12)
             
-            
-            # loop over half cycles
-            curCap = []; prevCap = [0,0]
-            for ((a,b),h) in zip(self.bat.halfStatPoints[self.h[0]:self.h[1]], self.bat.halfStatCycles[self.h[0]:self.h[1]]):
-                if a < self.p[0]: a = self.p[0]
-                if b > self.p[1]: b = self.p[1]
-                curCap = [self.bat.we.capacity[b-1], self.bat.ce.capacity[b-1]]
-                if h % 2 == 0:
-                    ax1.plot(self.bat.we.capacity[a:b], self.bat.we.voltage[a:b], 'k-')
-                    ax2.plot(self.bat.ce.capacity[a:b], self.bat.ce.voltage[a:b], 'k-')
-                else:
-                    ax1.plot(-1*self.bat.we.capacity[a:b]+prevCap[0], self.bat.we.voltage[a:b], 'k-')
-                    ax2.plot(-1*self.bat.ce.capacity[a:b]+prevCap[1], self.bat.ce.voltage[a:b], 'k-')
-                prevCap = curCap
+            # all half cycles
+            self.addLines(ax1, limits, self.bat.we.getCapacity(), self.bat.we.getVoltage(),
+                          xscale=scale, xshift=shift(self.bat.we.getCapacity()))
+            self.addLines(ax2, limits, self.bat.ce.getCapacity(), self.bat.ce.getVoltage(),
+                          xscale=scale, xshift=shift(self.bat.ce.getCapacity()))
         
         fig.tight_layout()
         
@@ -245,8 +335,11 @@ class Plot(object):
     def figVoltageCurrent(self):
         """voltage and current"""
         
+        a = self.p[0] - self.offset; b = self.p[1] - self.offset
+        time = self.bat.getTestTime()[a:b]
+        
         # half cell
-        if not self.bat.isFullCell:       
+        if not self.bat.getIsFullCell():       
             fig = plt.figure(3, figsize=(12,6))
             fig.canvas.set_window_title("Figure 3 - voltage, current")
 
@@ -259,10 +352,8 @@ class Plot(object):
             ax2.autoscale(axis='x', tight='tight')
             ax2.set_ylabel('Current [mA]', fontsize=12)
            
-            ax1.plot(self.bat.testTime[self.p[0]:self.p[1]], 
-                     self.bat.we.voltage[self.p[0]:self.p[1]], 'k-', label='voltage')
-            ax2.plot(self.bat.testTime[self.p[0]:self.p[1]], 
-                     self.bat.current[self.p[0]:self.p[1]], 'k--', label='current')
+            ax1.plot(*self.decimate(fig, time, self.bat.we.getVoltage()[a:b]), 'k-', label='voltage')
+            ax2.plot(*self.decimate(fig, time, self.bat.getCurrent()[a:b]), 'k--', label='current')
             
         # full cell
         else:
@@ -278,10 +369,8 @@ class Plot(object):
             ax2.autoscale(axis='x', tight='tight')
             ax2.set_ylabel('Current [mA]', fontsize=12)
            
-            ax1.plot(self.bat.testTime[self.p[0]:self.p[1]], 
-                     self.bat.we.voltage[self.p[0]:self.p[1]], 'k-', label='voltage')
-            ax2.plot(self.bat.testTime[self.p[0]:self.p[1]], 
-                     self.bat.current[self.p[0]:self.p[1]], 'k--', label='current')
+            ax1.plot(*self.decimate(fig, time, self.bat.we.getVoltage()[a:b]), 'k-', label='voltage')
+            ax2.plot(*self.decimate(fig, time, self.bat.getCurrent()[a:b]), 'k--', label='current')
             
             # counter electrode plot
             ax3 = fig.add_subplot(212)
@@ -292,16 +381,17 @@ class Plot(object):
             ax4.autoscale(axis='x', tight='tight')
             ax4.set_ylabel('Current [mA]', fontsize=12)
            
-            ax3.plot(self.bat.testTime[self.p[0]:self.p[1]], 
-                     self.bat.ce.voltage[self.p[0]:self.p[1]], 'k-', label='voltage')
-            ax4.plot(self.bat.testTime[self.p[0]:self.p[1]], 
-                     -1*self.bat.current[self.p[0]:self.p[1]], 'k--', label='current')
+            ax3.plot(*self.decimate(fig, time, self.bat.ce.getVoltage()[a:b]), 'k-', label='voltage')
+            ax4.plot(*self.decimate(fig, time, -1*self.bat.getCurrent()[a:b]), 'k--', label='current')
         
         fig.tight_layout()
         
 
     def figTemperature(self):
         """auxiliary channel, e.g. temperature"""
+        
+        a = self.p[0] - self.offset; b = self.p[1] - self.offset
+        time = self.bat.getTestTime()[a:b]
     
         fig = plt.figure(4, figsize=(12,6))
         fig.canvas.set_window_title("Figure 4 - temperature")
@@ -311,8 +401,7 @@ class Plot(object):
         ax1.set_xlabel('Time [h]', fontsize=12)
         ax1.set_ylabel('Temperature [°C]', fontsize=12)
 
-        ax1.plot(self.bat.testTime[self.p[0]:self.p[1]], 
-                 self.bat.temperature[self.p[0]:self.p[1]], 'k-')
+        ax1.plot(*self.decimate(fig, time, self.bat.getTemperature()[a:b]), 'k-')
         
         fig.tight_layout()
         
@@ -325,8 +414,14 @@ class Plot(object):
         if self.args.showSmooth:
             level = (self.args.showSmooth-1) * 6 + 5
             
+        # discharge is plotted negative, rest cycles have no sign
+        limits = self.getHalfCycleLimits()
+        sign = np.sign(self.bat.getHalfStatStep()[self.h[0]:self.h[1]].ravel())
+        if np.any(sign == 0):
+            sys.exit("ERROR: Rest cycles not supported")
+            
         # half cell
-        if not self.bat.isFullCell:
+        if not self.bat.getIsFullCell():
             fig = plt.figure(5, figsize=(9,6))
             fig.canvas.set_window_title("Figure 5 - differential capacity")
             
@@ -335,25 +430,9 @@ class Plot(object):
             ax1.set_xlabel('Voltage [V]', fontsize=12)
             ax1.set_ylabel('dQ/dV [As V$^{-1}$]', fontsize=12) 
             
-            # loop over half cycles
-            for ((a,b),s) in zip(self.bat.halfStatPoints[self.h[0]:self.h[1]], self.bat.halfStatStep[self.h[0]:self.h[1]]):
-                if a < self.p[0]: a = self.p[0]
-                if b > self.p[1]: b = self.p[1]
-                # charge
-                if s > 0 and (self.args.showSmooth is not None):
-                    ax1.plot(self.smooth(self.bat.we.voltage[a:b,0], window_len=level, window='hamming'),
-                             self.smooth(self.bat.we.dqdv[a:b,0], window_len=level, window='hamming'), 'k-')
-                elif s > 0:
-                    ax1.plot(self.bat.we.voltage[a:b], self.bat.we.dqdv[a:b], 'k-')
-                # discharge
-                elif s < 0 and (self.args.showSmooth is not None):
-                    ax1.plot(self.smooth(self.bat.we.voltage[a:b,0], window_len=level, window='hamming'),
-                             self.smooth(-1*self.bat.we.dqdv[a:b,0], window_len=level, window='hamming'), 'k-')
-                elif s < 0:
-                    ax1.plot(self.bat.we.voltage[a:b], -1*self.bat.we.dqdv[a:b], 'k-')
-                # rest 
-                else:
-                    sys.exit("ERROR: Rest cycles not supported")
+            # all half cycles
+            self.addLines(ax1, limits, self.bat.we.getVoltage(), self.bat.we.getDqDv(),
+                          yscale=sign, level=level)
                     
         # full cell
         else:
@@ -370,29 +449,11 @@ class Plot(object):
             ax2.set_xlabel('CE potential [V]', fontsize=12)
             ax2.set_ylabel('dQ/dV [As V$^{-1}$]', fontsize=12)
                     
-            # loop over half cycles
-            for ((a,b),s) in zip(self.bat.halfStatPoints[self.h[0]:self.h[1]], self.bat.halfStatStep[self.h[0]:self.h[1]]):
-                if a < self.p[0]: a = self.p[0]
-                if b > self.p[1]: b = self.p[1]
-
-                if s > 0 and (self.args.showSmooth is not None):
-                    ax1.plot(self.smooth(self.bat.we.voltage[a:b], window_len=level, window='hamming'),
-                             self.smooth(self.bat.we.dqdv[a:b], window_len=level, window='hamming'), 'k-')
-                    ax2.plot(self.smooth(self.bat.ce.voltage[a:b], window_len=level, window='hamming'),
-                             self.smooth(self.bat.ce.dqdv[a:b], window_len=level, window='hamming'), 'k-')
-                elif s > 0:
-                    ax1.plot(self.bat.we.voltage[a:b], self.bat.we.dqdv[a:b], 'k-')
-                    ax2.plot(self.bat.ce.voltage[a:b], self.bat.ce.dqdv[a:b], 'k-')
-                elif s < 0 and (self.args.showSmooth is not None):
-                    ax1.plot(self.smooth(self.bat.we.voltage[a:b], window_len=level, window='hamming'),
-                             self.smooth(-1*self.bat.we.dqdv[a:b], window_len=level, window='hamming'), 'k-')
-                    ax2.plot(self.smooth(self.bat.ce.voltage[a:b], window_len=level, window='hamming'),
-                             self.smooth(-1*self.bat.ce.dqdv[a:b], window_len=level, window='hamming'), 'k-')
-                elif s < 0:
-                    ax1.plot(self.bat.we.voltage[a:b], -1*self.bat.we.dqdv[a:b], 'k-')
-                    ax2.plot(self.bat.ce.voltage[a:b], -1*self.bat.ce.dqdv[a:b], 'k-')
-                else:
-                    sys.exit("ERROR: Rest cycles not supported")
+            # all half cycles
+            self.addLines(ax1, limits, self.bat.we.getVoltage(), self.bat.we.getDqDv(),
+                          yscale=sign, level=level)
+            self.addLines(ax2, limits, self.bat.ce.getVoltage(), self.bat.ce.getDqDv(),
+                          yscale=sign, level=level)
                     
         fig.tight_layout()
         
@@ -403,7 +464,7 @@ class Plot(object):
         """template for plots vs. cycle number"""
 
         # half cell
-        if not self.bat.isFullCell:
+        if not self.bat.getIsFullCell():
             fig = plt.figure(plotnum, figsize=(9,6))
             fig.canvas.set_window_title("Figure %d - %s" % (plotnum, title))
         
@@ -411,10 +472,10 @@ class Plot(object):
             ax1 = fig.add_subplot(111)
             ax1.set_xlabel('Cycle', fontsize=12)
             ax1.set_ylabel(ylabel, fontsize=12)            
-            ax1.plot(self.bat.statCycles[self.c[0]:self.c[1]]+1, 
-                     getattr(self.bat.we, y)[self.c[0]:self.c[1],0], 'ko-', label='charge')
-            ax1.plot(self.bat.statCycles[self.c[0]:self.c[1]]+1, 
-                     getattr(self.bat.we, y)[self.c[0]:self.c[1],1], 'kD-', label='discharge')
+            ax1.plot(self.bat.getStatCycles()[self.c[0]:self.c[1]]+1, 
+                     getattr(self.bat.we, y)()[self.c[0]:self.c[1],0], 'ko-', label='charge')
+            ax1.plot(self.bat.getStatCycles()[self.c[0]:self.c[1]]+1, 
+                     getattr(self.bat.we, y)()[self.c[0]:self.c[1],1], 'kD-', label='discharge')
             #if plotnum in [6,7,8,9]:
             #    ylim = ax1.get_ylim()
             #    ax1.set_ylim([0,ylim[1]])
@@ -432,10 +493,10 @@ class Plot(object):
             ax1 = fig.add_subplot(121)
             ax1.set_xlabel('Cycle', fontsize=12)
             ax1.set_ylabel('WE %s' % ylabel, fontsize=12)            
-            ax1.plot(self.bat.statCycles[self.c[0]:self.c[1]]+1, 
-                     getattr(self.bat.we, y)[self.c[0]:self.c[1],0], 'ko-', label='charge')
-            ax1.plot(self.bat.statCycles[self.c[0]:self.c[1]]+1, 
-                     getattr(self.bat.we, y)[self.c[0]:self.c[1],1], 'kD-', label='discharge')
+            ax1.plot(self.bat.getStatCycles()[self.c[0]:self.c[1]]+1, 
+                     getattr(self.bat.we, y)()[self.c[0]:self.c[1],0], 'ko-', label='charge')
+            ax1.plot(self.bat.getStatCycles()[self.c[0]:self.c[1]]+1, 
+                     getattr(self.bat.we, y)()[self.c[0]:self.c[1],1], 'kD-', label='discharge')
             #if plotnum in [6,7,8,9]:
             #    ylim = ax1.get_ylim()
             #    ax1.set_ylim([0,ylim[1]])
@@ -444,10 +505,10 @@ class Plot(object):
             ax2 = fig.add_subplot(122)
             ax2.set_xlabel('Cycle', fontsize=12)
             ax2.set_ylabel('CE %s' % ylabel, fontsize=12)
-            ax2.plot(self.bat.statCycles[self.c[0]:self.c[1]]+1, 
-                     getattr(self.bat.ce, y)[self.c[0]:self.c[1],0], 'ko-', label='charge')
-            ax2.plot(self.bat.statCycles[self.c[0]:self.c[1]]+1, 
-                     getattr(self.bat.ce, y)[self.c[0]:self.c[1],1], 'kD-', label='discharge')
+            ax2.plot(self.bat.getStatCycles()[self.c[0]:self.c[1]]+1, 
+                     getattr(self.bat.ce, y)()[self.c[0]:self.c[1],0], 'ko-', label='charge')
+            ax2.plot(self.bat.getStatCycles()[self.c[0]:self.c[1]]+1, 
+                     getattr(self.bat.ce, y)()[self.c[0]:self.c[1],1], 'kD-', label='discharge')
             if plotnum in [6,7,8,9]:
                 ylim = ax2.get_ylim()
                 ax2.set_ylim([0,ylim[1]])
@@ -461,56 +522,56 @@ class Plot(object):
         """specific capacity plot"""
         self._TemplateStatPlot(6, "specific capacity",
                                "Specific capacity [mAh g$^{-1}$]",
-                               "statSpecificCapacity")
+                               "getStatSpecificCapacity")
         
 
     def figVolumetricCapacity(self):
         """volumetric capacity plot"""        
         self._TemplateStatPlot(7, "volumetric capacity",
                                "Volumetric capacity [Ah L$^{-1}$]",
-                               "statVolumetricCapacity")
+                               "getStatVolumetricCapacity")
 
     
     def figSpecificEnergy(self):
         """specific energy plot"""        
         self._TemplateStatPlot(8, "specific energy",
                               "Specific energy [Wh kg$^{-1}$]",
-                              "statSpecificEnergy")
+                              "getStatSpecificEnergy")
 
 
     def figVolumetricEnergy(self):
         """volumetric energy plot"""
         self._TemplateStatPlot(9, "volumetric energy",
                               "Volumetric energy [Wh L$^{-1}$]",
-                              "statVolumetricEnergy")
+                              "getStatVolumetricEnergy")
         
 
     def figSpecificCurrentDensity(self):
         """Specific current density"""        
         self._TemplateStatPlot(10, "specific current density",
                               "Specific current density [mA g$^{-1}$]",
-                              "statSpecificCurrentDensity")
+                              "getStatSpecificCurrentDensity")
         
 
     def figAreaCurrentDensity(self):
         """Area current density"""        
         self._TemplateStatPlot(11, "current density",
                               "Current density [mA cm$^{-2}$]",
-                              "statAreaCurrentDensity")
+                              "getStatAreaCurrentDensity")
         
 
     def figCRate(self):
         """C-rate"""        
         self._TemplateStatPlot(12, "C-rate",
                               "C-rate (x in C x$^{-1}$) [h]",
-                              "statCRate")
+                              "getStatCRate")
         
         
     def figHysteresis(self):
         """average voltages and hysteresis"""
 
         # half cell
-        if not self.bat.isFullCell:
+        if not self.bat.getIsFullCell():
             fig = plt.figure(13, figsize=(9,6))
             fig.canvas.set_window_title("Figure 13 - voltage hysteresis")
         
@@ -518,12 +579,12 @@ class Plot(object):
             ax1 = fig.add_subplot(111)
             ax1.set_xlabel('Cycle', fontsize=12)
             ax1.set_ylabel('Voltage [V]', fontsize=12)            
-            ax1.plot(self.bat.statCycles[self.c[0]:self.c[1]]+1, 
-                     self.bat.we.statAverageVoltage[self.c[0]:self.c[1],0], 'ko--', label='charge')
-            ax1.plot(self.bat.statCycles[self.c[0]:self.c[1]]+1, 
-                     self.bat.we.statAverageVoltage[self.c[0]:self.c[1],1], 'kD--', label='discharge')
-            ax1.plot(self.bat.statCycles[self.c[0]:self.c[1]]+1, 
-                     self.bat.we.statHysteresis[self.c[0]:self.c[1]], 'ks-', label='hysteresis')
+            ax1.plot(self.bat.getStatCycles()[self.c[0]:self.c[1]]+1, 
+                     self.bat.we.getStatAverageVoltage()[self.c[0]:self.c[1],0], 'ko--', label='charge')
+            ax1.plot(self.bat.getStatCycles()[self.c[0]:self.c[1]]+1, 
+                     self.bat.we.getStatAverageVoltage()[self.c[0]:self.c[1],1], 'kD--', label='discharge')
+            ax1.plot(self.bat.getStatCycles()[self.c[0]:self.c[1]]+1, 
+                     self.bat.we.getStatHysteresis()[self.c[0]:self.c[1]], 'ks-', label='hysteresis')
             #ylim = ax1.get_ylim()
             #ax1.set_ylim([0,ylim[1]])
             
@@ -540,12 +601,12 @@ class Plot(object):
             ax1 = fig.add_subplot(121)
             ax1.set_xlabel('Cycle', fontsize=12)
             ax1.set_ylabel('WE potential [v]', fontsize=12)            
-            ax1.plot(self.bat.statCycles[self.c[0]:self.c[1]]+1, 
-                     self.bat.we.statAverageVoltage[self.c[0]:self.c[1],0], 'ko--', label='charge')
-            ax1.plot(self.bat.statCycles[self.c[0]:self.c[1]]+1, 
-                     self.bat.we.statAverageVoltage[self.c[0]:self.c[1],1], 'kD--', label='discharge')
-            ax1.plot(self.bat.statCycles[self.c[0]:self.c[1]]+1, 
-                     self.bat.we.statHysteresis[self.c[0]:self.c[1]], 'ks-', label='hysteresis')
+            ax1.plot(self.bat.getStatCycles()[self.c[0]:self.c[1]]+1, 
+                     self.bat.we.getStatAverageVoltage()[self.c[0]:self.c[1],0], 'ko--', label='charge')
+            ax1.plot(self.bat.getStatCycles()[self.c[0]:self.c[1]]+1, 
+                     self.bat.we.getStatAverageVoltage()[self.c[0]:self.c[1],1], 'kD--', label='discharge')
+            ax1.plot(self.bat.getStatCycles()[self.c[0]:self.c[1]]+1, 
+                     self.bat.we.getStatHysteresis()[self.c[0]:self.c[1]], 'ks-', label='hysteresis')
             #ylim = ax1.get_ylim()
             #ax1.set_ylim([0,ylim[1]])
             
@@ -553,12 +614,12 @@ class Plot(object):
             ax2 = fig.add_subplot(122)
             ax2.set_xlabel('Cycle', fontsize=12)
             ax2.set_ylabel('CE potential [V]', fontsize=12)
-            ax2.plot(self.bat.statCycles[self.c[0]:self.c[1]]+1, 
-                     self.bat.ce.statAverageVoltage[self.c[0]:self.c[1],0], 'ko--', label='charge')
-            ax2.plot(self.bat.statCycles[self.c[0]:self.c[1]]+1, 
-                     self.bat.ce.statAverageVoltage[self.c[0]:self.c[1],1], 'kD--', label='discharge')
-            ax2.plot(self.bat.statCycles[self.c[0]:self.c[1]]+1, 
-                     self.bat.ce.statHysteresis[self.c[0]:self.c[1]], 'ks-', label='hysteresis')
+            ax2.plot(self.bat.getStatCycles()[self.c[0]:self.c[1]]+1, 
+                     self.bat.ce.getStatAverageVoltage()[self.c[0]:self.c[1],0], 'ko--', label='charge')
+            ax2.plot(self.bat.getStatCycles()[self.c[0]:self.c[1]]+1, 
+                     self.bat.ce.getStatAverageVoltage()[self.c[0]:self.c[1],1], 'kD--', label='discharge')
+            ax2.plot(self.bat.getStatCycles()[self.c[0]:self.c[1]]+1, 
+                     self.bat.ce.getStatHysteresis()[self.c[0]:self.c[1]], 'ks-', label='hysteresis')
             #ylim = ax2.get_ylim()
             #ax2.set_ylim([0,ylim[1]])
             
@@ -577,14 +638,35 @@ class Plot(object):
         ax1 = fig.add_subplot(111)
         ax1.set_xlabel('Cycle', fontsize=12)
         ax1.set_ylabel('Coulombic efficiency [%]', fontsize=12)            
-        ax1.plot(self.bat.statCycles[self.c[0]:self.c[1]]+1, 
-                 self.bat.statEfficiency[self.c[0]:self.c[1],0], 'ko-')
+        ax1.plot(self.bat.getStatCycles()[self.c[0]:self.c[1]]+1, 
+                 self.bat.getStatEfficiency()[self.c[0]:self.c[1],0], 'ko-')
         #ylim = ax1.get_ylim()
         #ax1.set_ylim([0,ylim[1]+0.1*ylim[1]])
         
         fig.tight_layout()
     
 
+    def decimate(self, fig, x, y):
+        """reduce a time series to the first, minimum, maximum and last point
+           of each bin, about one bin per pixel of the figure width. Peaks are
+           kept and the series looks the same at the resolution of the figure.
+           The bins are equal slices of the data points found with one reshape,
+           the remaining points form a last smaller bin."""
+        bins = int(fig.get_figwidth() * fig.dpi)
+        if self.args.showFull or len(x) <= 4 * bins:
+            return x, y
+        size = -(-len(x) // bins)
+        bins = len(x) // size
+        rows = np.arange(bins) * size
+        z = y[:bins*size].reshape(bins, size)
+        index = [rows, rows + np.argmin(z, axis=1), rows + np.argmax(z, axis=1), rows + size - 1]
+        if len(x) > bins * size:
+            rest = y[bins*size:]
+            index.append(bins * size + np.array([0, np.argmin(rest), np.argmax(rest), len(rest) - 1]))
+        index = np.unique(np.concatenate(index))
+        return x[index], y[index]
+    
+    
     def smooth(self, x, window_len=11, window='hanning'):
         """smooth.py from http://wiki.scipy.org/Cookbook/SignalSmooth
         smooth the data using a window with requested size.
@@ -1,21 +1,28 @@
 # -*- coding: utf-8 -*-
 import sys, os
 import subprocess
-from distutils.spawn import find_executable
+import concurrent.futures
+import multiprocessing
+import shutil
 import sqlite3
 
-# import own files
-from plotpot.plot import Plot
+# import own files, modules using numpy and matplotlib are imported by the
+# sub-commands which need them
 from plotpot.journal import Journal
-from plotpot.battery import Battery
 from plotpot.dbmanager import DbManager
+from plotpot.profiler import Profiler
+from plotpot.index import Index
+from plotpot.fingerprint import Fingerprint
+from plotpot.merge import Merge
+from plotpot.probe import Probe
 
 
 class Plotpot(object):
     
     def __init__(self, args):
         self.args = args
-        self.setConvpotPath()
+        self.convpotPath = None
+        self.setProfiler()
         self.setGlobalArgs()
         
         if self.args.subcommand == "show":
@@ -27,28 +34,54 @@ class Plotpot(object):
         if self.args.subcommand == "merge":
             self.subcommandMerge()
             
+        if self.args.subcommand == "index":
+            self.subcommandIndex()
+            
+        if self.args.subcommand == "convert":
+            self.subcommandConvert()
+            
+        if self.args.subcommand == "info":
+            self.subcommandInfo()
+        
+        self.printProfile()
+            
 
     def subcommandShow(self):
         """run show subcommand"""
         
+        # plots are only saved with the quiet option, no window is needed
+        if self.args.showQuiet:
+            import matplotlib
+            matplotlib.use('Agg')
+        from plotpot.plot import Plot
+        from plotpot.battery import Battery
+        
         # call convpot to convert raw data
-        self.callConvpot()
+        with self.profiler.section("convert"):
+            self.callConvpot()
         
         # create battery object
-        bat = Battery(self.args, self.globalArgs)
+        with self.profiler.section("load battery"):
+            bat = Battery(self.args, self.globalArgs)
         
-        # create figures
+        # create figures, exported figures without display are drawn by
+        # the workers saving them
         plot = Plot(self.args, bat)
-        plot.drawPlots()
+        if not (self.args.showQuiet and self.args.showExport):
+            with self.profiler.section("draw plots"):
+                plot.drawPlots()
         
         # export data and statistics  
         if self.args.showExport:
             print("INFO: Exporting data, statistics and figures.")
-            bat.export()
-            plot.savePlots()
+            with self.profiler.section("export data"):
+                bat.export()
+            with self.profiler.section("save plots"):
+                plot.savePlots()
         
         # show plots if quiet option not given
         if not self.args.showQuiet:
+            self.printProfile()
             plot.showPlots()
 
             
@@ -78,19 +111,57 @@ class Plotpot(object):
         
         
     def subcommandMerge(self):
-        """run merge subcommand"""
+        """run merge subcommand, the raw files are converted first and the
+           converted files merged without Convpot"""
+        dataFileName = self.globalArgs['dataFileName']
+        
+        if self.args.mergeConvpot:
+            self.callConvpotMerge()
+        else:
+            # raw files listed in text file, lines starting with ! are ignored
+            if self.args.mergeList:
+                with open(self.args.mergeList, "r") as fh:
+                    fileNames = [os.path.join(os.path.dirname(self.args.mergeList), x.strip())
+                                 for x in fh if x.strip() and not x.startswith('!')]
+            else:
+                fileNames = self.args.mergeFileNames
+            
+            # convert raw files which are not up-to-date
+            rawFileNames = [x for x in fileNames if x.rsplit('.')[-1] != "sqlite"]
+            converted, failed = self.convertFiles(rawFileNames)
+            if failed:
+                sys.exit("ERROR: %d of %d files not converted." % (len(failed), len(rawFileNames)))
+            
+            # merge converted files
+            dataFileNames = [x.rsplit('.')[0]+'.sqlite' for x in fileNames]
+            if os.path.abspath(dataFileName) in [os.path.abspath(x) for x in dataFileNames]:
+                sys.exit("ERROR: Output file %s is one of the merged files." % dataFileName)
+            print("INFO: Merging %d files." % len(dataFileNames))
+            try:
+                Merge(dataFileName, dataFileNames).mergeFiles()
+            except sqlite3.Error as e:
+                sys.exit("ERROR: Merge failed (%s)." % e)
+        
+        # indexes and journal
+        self.createIndex(dataFileName)
+        journal = Journal(self.args, self.globalArgs, "working")
+        if journal.batIsFullCell:
+            Journal(self.args, self.globalArgs, "counter", journal.batIsFullCell)
+    
+    
+    def callConvpotMerge(self):
+        """convert and merge raw files with Convpot"""
 
         # # construct call to convpot
         convpotArgs = []
-        convpotArgs.append(self.convpotPath)
+        convpotArgs.append(self.getConvpotPath())
         
         # verbose arg
         if self.args.verbose:
             convpotArgs.append("-{0}".format(self.args.verbose * 'v'))
         
         # output filename
-        if self.args.mergeOutput:
-            convpotArgs.extend(["-o", self.args.mergeOutput])
+        convpotArgs.extend(["-o", self.globalArgs['dataFileName']])
         
         # merge list
         if self.args.mergeList:
@@ -106,11 +177,48 @@ class Plotpot(object):
                 subprocess.check_call(convpotArgs)
             except subprocess.CalledProcessError as e:
                 sys.exit(e)
-        
-        # journal
-        journal = Journal(self.args, self.globalArgs, "working")
-        if journal.batIsFullCell:
-            Journal(self.args, self.globalArgs, "counter")
+    
+    
+    def subcommandIndex(self):
+        """run index subcommand"""
+        for fileName in self.args.indexFileNames:
+            dataFileName = fileName.rsplit('.')[0]+'.sqlite'
+            if not os.path.isfile(dataFileName):
+                sys.exit("ERROR: File %s not converted." % dataFileName)
+            self.createIndex(dataFileName, self.args.indexForce)
+    
+    
+    def subcommandConvert(self):
+        """run convert subcommand, several raw files are converted at once
+           by Convpot or in worker processes"""
+        converted, failed = self.convertFiles(self.args.convertFileNames, self.args.convertForce)
+        
+        # register converted files in journal
+        for fileName in converted:
+            dataFileName = fileName.rsplit('.')[0]+'.sqlite'
+            globalArgs = {'dataFileName': dataFileName, 'convertFileName': fileName}
+            journal = Journal(self.args, globalArgs, "working")
+            if journal.batIsFullCell:
+                Journal(self.args, globalArgs, "counter", journal.batIsFullCell)
+            DbManager.disconnect(dataFileName)
+            print("INFO: Converted %s." % fileName)
+            
+        if failed:
+            sys.exit("ERROR: %d of %d files not converted." % (len(failed), len(converted) + len(failed)))
+    
+    
+    def subcommandInfo(self):
+        """run info subcommand"""
+        for i, fileName in enumerate(self.args.infoFileNames):
+            dataFileName = fileName.rsplit('.')[0]+'.sqlite'
+            if not os.path.isfile(dataFileName):
+                sys.exit("ERROR: File %s not converted." % dataFileName)
+            if i > 0:
+                print()
+            try:
+                Probe(dataFileName).displayInfo()
+            except sqlite3.DatabaseError as e:
+                sys.exit("ERROR: File %s not readable (%s)." % (dataFileName, e))
     
     
     ### internal methods ###
@@ -143,26 +251,40 @@ class Plotpot(object):
                 self.globalArgs = {'dataFileName': self.args.mergeList.split('.')[0]+".sqlite"}
             
             elif self.args.mergeFileNames:
-                self.globalArgs = {'dataFileName': self.args.mergeFileNames[0].split('.')[0]+".sqlite"}
+                self.globalArgs = {'dataFileName': self.args.mergeFileNames[0].split('.')[0]+"_merged.sqlite"}
             
     
     def getGlobalArgs(self):
         """return global args"""
         return self.globalArgs
+    
+    
+    def setProfiler(self):
+        """record queries and timings with --profile or --verbose option"""
+        self.profiler = Profiler()
+        if self.args.profile or self.args.verbose:
+            DbManager.profiler = self.profiler
+            
+            
+    def printProfile(self):
+        """print profile summary once"""
+        if DbManager.profiler:
+            self.profiler.printSummary()
+            DbManager.profiler = None
 
 
     def setConvpotPath(self):
-        """check if Convpot is installed and return path of executable"""
+        """check if Convpot is installed and set path of executable"""
         
         # search path for Convpot program
-        self.convpotPath = find_executable("convpot")
+        self.convpotPath = shutil.which("convpot")
         
-        # search in current dir
+        # search in program dir
         if self.convpotPath is None:
-            self.convpotPath = find_executable("convpot", sys.argv[0])
+            self.convpotPath = shutil.which("convpot", path=os.path.dirname(os.path.abspath(sys.argv[0])))
         
         if not self.convpotPath:
-            sys.exit("ERROR: Convpot program not installed.")
+            sys.exit("ERROR: Convpot program not installed, see https://github.com/ahpohl/convpot/")
             
         # test if convpot is executable
         if not os.access(self.convpotPath, os.X_OK):
@@ -170,7 +292,9 @@ class Plotpot(object):
             
 
     def getConvpotPath(self):
-        """return Convpot path"""
+        """return Convpot path, Convpot is searched on first use"""
+        if self.convpotPath is None:
+            self.setConvpotPath()
         return self.convpotPath
 
     
@@ -295,41 +419,213 @@ class Plotpot(object):
     def callConvpot(self):
         """create the sqlite database by calling Convpot to convert raw
         data. Check if sqlite file is up-to-date and skip conversion 
-        if necessary."""
+        if necessary. The fingerprint of the raw file is compared with the
+        checksum in the sqlite header without opening the database."""
         
         # get extension of raw file
         rawFileExtension = self.args.showFileName.rsplit('.')[1]
+        dataFileName = self.globalArgs['dataFileName']
+        
+        # sqlite file given directly
+        if rawFileExtension == "sqlite":
+            self.createIndex(dataFileName)
+            return
         
         # test if sqlite file needs updating
-        isUpToDate = self.checkRawFileSize()
+        fingerprint = Fingerprint(self.args.showFileName)
+        checksum = fingerprint.readChecksum(dataFileName)
+        if not self.args.showForce and checksum == fingerprint.getChecksum():
+            if self.args.verbose:
+                print("Fingerprint match!")
+            return
+        
+        # Gamry files read without Convpot keep their data points only in
+        # the memory mapped store with --store-only
+        native = self.getIsNative(self.args.showFileName)
+        if native and self.args.showStoreOnly and not self.args.showForce and \
+                self.getIsStored(dataFileName, fingerprint):
+            if self.args.verbose:
+                print("Fingerprint match!")
+            return
+        
+        # files converted without fingerprint are checked by size
+        isUpToDate = (checksum == 0) and not native and self.checkRawFileSize()
+        
+        if self.args.showForce or not isUpToDate:
+        
+            # read Gamry files without Convpot
+            if native:
+                from plotpot.gamry import Gamry
+                try:
+                    if Gamry.convert(self.args.showFileName, dataFileName, points=not self.args.showStoreOnly,
+                                     store=True, append=not self.args.showForce):
+                        print("INFO: Appended new data points of %s." % self.args.showFileName)
+                except ValueError as e:
+                    sys.exit("ERROR: %s" % e)
+                self.createIndex(dataFileName)
+                return
+                    
+            else:
+                # construct call to convpot
+                convpotArgs = []
+                convpotArgs.append(self.getConvpotPath())
+            
+                # verbose arg
+                if self.args.verbose:
+                    convpotArgs.append("-{0}".format(self.args.verbose * 'v'))
+                    
+                # filename arg
+                convpotArgs.append(self.args.showFileName)
+    
+                # release shared connection, Convpot rewrites the file
+                DbManager.disconnect(dataFileName)
+    
+                # call external Convpot program
+                try:
+                    subprocess.check_call(convpotArgs)
+                except subprocess.CalledProcessError as e:
+                    sys.exit(e)
+        
+        # create indexes and record fingerprint
+        self.createIndex(dataFileName)
+        try:
+            fingerprint.writeFingerprint(dataFileName)
+        except sqlite3.OperationalError as e:
+            print("INFO: Could not store fingerprint (%s)." % e)
+        DbManager.disconnect(dataFileName)
+                
+                
+    def convertFiles(self, fileNames, force=False):
+        """convert raw files which are not up-to-date, Convpot in a pool of
+           worker threads and Gamry files in a pool of worker processes, then
+           create indexes and store fingerprints. Return lists of converted
+           and failed files."""
+        
+        # skip files which are up-to-date
+        pending = []
+        for fileName in fileNames:
+            if not os.path.isfile(fileName):
+                sys.exit("ERROR: File %s not found." % fileName)
+            dataFileName = fileName.rsplit('.')[0]+'.sqlite'
+            if force or not Fingerprint(fileName).getIsUpToDate(dataFileName):
+                pending.append(fileName)
+            elif self.args.verbose:
+                print("INFO: File %s is up-to-date." % fileName)
+        
+        # search Convpot before the workers start
+        if not all(self.getIsNative(x) for x in pending):
+            self.getConvpotPath()
+        
+        # Convpot subprocesses are waited for by threads, Gamry files are
+        # parsed by worker processes, results in order of completion
+        workers = getattr(self.args, 'convertJobs', None) or os.cpu_count() or 1
+        native = [x for x in pending if self.getIsNative(x)]
+        external = [x for x in pending if not self.getIsNative(x)]
+        results = []
+        if min(workers, len(native)) < 2:
+            results += [self.runGamry(x, not force) for x in native]
+            native = []
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as threads, \
+             concurrent.futures.ProcessPoolExecutor(max_workers=max(min(workers, len(native)), 1),
+                                                    mp_context=context) as processes:
+            futures = [threads.submit(self.runConvpot, x) for x in external]
+            futures += [processes.submit(Plotpot.runGamry, x, not force) for x in native]
+            results += [x.result() for x in concurrent.futures.as_completed(futures)]
+        
+        # index and fingerprint are written one file after another
+        converted = []; failed = []
+        for fileName, returncode, stderr in sorted(results):
+            if returncode != 0:
+                print("ERROR: Convpot failed on %s (exit code %d)." % (fileName, returncode))
+                if stderr:
+                    print(stderr.rstrip())
+                failed.append(fileName)
+                continue
+            dataFileName = fileName.rsplit('.')[0]+'.sqlite'
+            self.createIndex(dataFileName)
+            if not self.getIsNative(fileName):
+                try:
+                    Fingerprint(fileName).writeFingerprint(dataFileName)
+                except sqlite3.OperationalError as e:
+                    print("INFO: Could not store fingerprint (%s)." % e)
+                DbManager.disconnect(dataFileName)
+            converted.append(fileName)
+        
+        return converted, failed
+    
+    
+    def getIsNative(self, fileName):
+        """return True if the raw file is read without Convpot"""
+        useConvpot = getattr(self.args, self.args.subcommand + 'Convpot', False)
+        return fileName.rsplit('.')[-1].upper() == "DTA" and not useConvpot
+    
+    
+    def getIsStored(self, dataFileName, fingerprint):
+        """return True if the data points of the converted file are kept in a
+           memory mapped store of the raw file with fingerprint"""
+        if not os.path.isfile(dataFileName):
+            return False
+        try:
+            store = Probe(dataFileName).getStore()
+        except sqlite3.DatabaseError:
+            return False
+        finally:
+            DbManager.disconnect(dataFileName)
+        return store.getIsValid() and store.getFingerprint() == fingerprint.getFingerprint()
+    
+    
+    @staticmethod
+    def runGamry(fileName, append=True):
+        """read a Gamry file without Convpot and return file name, exit code
+           and error output. Runs in a worker process of the convert pool,
+           parsing holds the interpreter lock. A grown file is appended to
+           its sqlite file unless append is False."""
+        from plotpot.gamry import Gamry
+        try:
+            Gamry.convert(fileName, fileName.rsplit('.')[0]+'.sqlite', append=append)
+        except (ValueError, OSError) as e:
+            return fileName, 1, str(e)
+        return fileName, 0, ""
+    
+    
+    def runConvpot(self, fileName):
+        """call Convpot on a raw file and return file name, exit code and
+           error output. Runs in a worker thread of the convert pool."""
+        convpotArgs = [self.getConvpotPath()]
+        if self.args.verbose:
+            convpotArgs.append("-{0}".format(self.args.verbose * 'v'))
+        convpotArgs.append(fileName)
         
-        if (self.args.showForce or not isUpToDate) and (rawFileExtension != "sqlite"):
+        # release shared connection, Convpot rewrites the file
+        DbManager.disconnect(fileName.rsplit('.')[0]+'.sqlite')
         
-            # construct call to convpot
-            convpotArgs = []
-            convpotArgs.append(self.convpotPath)
+        try:
+            proc = subprocess.run(convpotArgs, stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.PIPE, universal_newlines=True)
+        except OSError as e:
+            return fileName, -1, str(e)
+        return fileName, proc.returncode, proc.stderr
+    
+    
+    def createIndex(self, dataFileName, force=False):
+        """create range indexes of a converted file if missing"""
+        try:
+            index = Index(dataFileName)
+            if force or not index.getIsIndexed():
+                index.createIndexes(rebuild=force)
+        except sqlite3.OperationalError as e:
+            print("INFO: Could not create indexes (%s)." % e)
+        
+        # release shared connections, read-only connections must see the indexes
+        DbManager.disconnect(dataFileName)
         
-            # verbose arg
-            if self.args.verbose:
-                convpotArgs.append("-{0}".format(self.args.verbose * 'v'))
-                
-            # filename arg 
-            convpotArgs.append(self.args.showFileName)
         
-            # call external Convpot program
-            try:
-                subprocess.check_call(convpotArgs)
-            except subprocess.CalledProcessError as e:
-                sys.exit(e)
-                
-                
     def checkRawFileSize(self):
         """Check file size of raw file and compare with size saved in 
            sqlite file. Return True if file is up-to-date and False
            if sizes differ."""
            
-        db = DbManager(self.globalArgs['dataFileName'])
-
         currentSize = 0
         with open(self.args.showFileName, 'r') as fh:
             fh.seek(0, os.SEEK_END)
@@ -339,6 +635,7 @@ class Plotpot(object):
         listOfVars = ["File_Size"]
         select_query = '''SELECT {0} FROM Global_Table'''.format(','.join(listOfVars))
         try:
+            db = DbManager(self.globalArgs['dataFileName'], readonly=True)
             db.query(select_query)
         except sqlite3.OperationalError as e:
             return False
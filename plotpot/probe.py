@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+import sys
+import datetime
+import sqlite3
+
+# own modules
+from plotpot.dbmanager import DbManager
+
+
+class Probe(DbManager):
+    """class for the meta information of a converted data file. The values
+       are read from Global_Table, the cycle tables and single rows found by
+       the primary key, no data columns are loaded into Python. Data points
+       are taken from the memory mapped store if it is up-to-date, Gamry
+       files converted by show --store-only keep them only there."""
+
+    def __init__(self, db):
+        super().__init__(db, readonly=True)
+        self.dataFileName = db
+        self.isFullCell = None
+        self.points = None
+        self.cycles = None
+        self.halfCycles = None
+        self.testTime = None
+        self.files = None
+        self.globals = None
+        self.store = None
+
+
+    def setGlobals(self):
+        """file name, size, start date, device and electrode properties"""
+        self.query('''SELECT File_Name,File_Size,DateTime,Device,Mass,Capacity,Area,Volume
+            FROM Global_Table''')
+        self.globals = dict(zip(['fileName', 'fileSize', 'dateTime', 'device', 'mass',
+                                 'capacity', 'area', 'volume'], self.fetchone()))
+
+
+    def getGlobals(self):
+        """return dict of Global_Table values"""
+        if self.globals is None:
+            self.setGlobals()
+        return self.globals
+
+
+    def setStore(self):
+        """open memory mapped store, valid for the size, data points and
+           fingerprint in Global_Table"""
+        from plotpot.store import Store
+        try:
+            self.query('''SELECT File_Size,Data_Points,Plotpot_Fingerprint FROM Global_Table''')
+        except sqlite3.OperationalError:
+            self.query('''SELECT File_Size,Data_Points FROM Global_Table''')
+        self.store = Store(self.dataFileName, list(self.fetchone()))
+
+
+    def getStore(self):
+        """return memory mapped store"""
+        if self.store is None:
+            self.setStore()
+        return self.store
+
+
+    def getStoreColumn(self, column):
+        """return memory mapped column of Channel_Normal_Table or None if the
+           store is not up-to-date"""
+        if not self.getStore().getIsValid():
+            self.checkPoints()
+            return None
+        return self.store.getColumn('Channel_Normal_Table', column)
+
+
+    def checkPoints(self):
+        """exit if the data points are kept only in the memory mapped store,
+           which is missing or out-of-date"""
+        self.query('''SELECT Data_Points FROM Global_Table''')
+        points = self.fetchone()[0]
+        self.query('''SELECT EXISTS (SELECT 1 FROM Channel_Normal_Table)''')
+        if points and not self.fetchone()[0]:
+            sys.exit("ERROR: Data points of %s are only kept in the memory mapped store, which is "
+                     "missing or out-of-date. Convert the raw file %s again."
+                     % (self.dataFileName, self.getGlobals()['fileName']))
+
+
+    def setIsFullCell(self):
+        """cell type recorded in Global_Table at conversion, otherwise test
+           if voltage2 column is not zero. The scan stops at the first data
+           point of a full cell."""
+        try:
+            self.query('''SELECT Plotpot_Full_Cell FROM Global_Table''')
+            isFullCell = self.fetchone()[0]
+        except sqlite3.OperationalError:
+            isFullCell = None
+        if isFullCell is not None:
+            self.isFullCell = bool(isFullCell)
+            return
+        column = self.getStoreColumn('Voltage2')
+        if column is not None:
+            self.isFullCell = bool(column.any())
+            return
+        self.query('''SELECT EXISTS (SELECT 1 FROM Channel_Normal_Table WHERE Voltage2 != 0)''')
+        self.isFullCell = bool(self.fetchone()[0])
+
+
+    def getIsFullCell(self):
+        """return boolean if full or half cell"""
+        if self.isFullCell is None:
+            self.setIsFullCell()
+        return self.isFullCell
+
+
+    def setPoints(self):
+        """number of data points as recorded in Global_Table, otherwise
+           the range of the first and last data point, each found by the
+           primary key"""
+        self.query('''SELECT Data_Points FROM Global_Table''')
+        self.points = self.fetchone()[0]
+        if self.points is not None:
+            return
+        column = self.getStoreColumn('Data_Point')
+        if column is not None:
+            self.points = len(column)
+            return
+        self.query('''SELECT MIN(Data_Point) FROM Channel_Normal_Table''')
+        first = self.fetchone()[0]
+        self.query('''SELECT MAX(Data_Point) FROM Channel_Normal_Table''')
+        last = self.fetchone()[0]
+        self.points = last - first + 1 if first is not None else 0
+
+
+    def getPoints(self):
+        """return number of data points"""
+        if self.points is None:
+            self.setPoints()
+        return self.points
+
+
+    def setCycles(self):
+        """number of full and half cycles"""
+        self.query('''SELECT COUNT(*) FROM Full_Cycle_Table''')
+        self.cycles = self.fetchone()[0]
+        self.query('''SELECT COUNT(*) FROM Half_Cycle_Table''')
+        self.halfCycles = self.fetchone()[0]
+
+
+    def getCycles(self):
+        """return number of full cycles"""
+        if self.cycles is None:
+            self.setCycles()
+        return self.cycles
+
+
+    def getHalfCycles(self):
+        """return number of half cycles"""
+        if self.halfCycles is None:
+            self.setCycles()
+        return self.halfCycles
+
+
+    def setTestTime(self):
+        """test time of the first and last data point in seconds"""
+        column = self.getStoreColumn('Test_Time')
+        if column is not None:
+            self.testTime = (float(column[0]), float(column[-1])) if len(column) else (0.0, 0.0)
+            return
+        self.query('''SELECT Test_Time FROM Channel_Normal_Table ORDER BY Data_Point LIMIT 1''')
+        first = self.fetchone()
+        self.query('''SELECT Test_Time FROM Channel_Normal_Table ORDER BY Data_Point DESC LIMIT 1''')
+        last = self.fetchone()
+        self.testTime = (first[0], last[0]) if first else (0.0, 0.0)
+
+
+    def getTestTime(self):
+        """return test time of the first and last data point in seconds"""
+        if self.testTime is None:
+            self.setTestTime()
+        return self.testTime
+
+
+    def setFiles(self):
+        """number of raw files of the battery"""
+        self.query('''SELECT COUNT(*) FROM File_Table''')
+        self.files = self.fetchone()[0]
+
+
+    def getFiles(self):
+        """return number of raw files"""
+        if self.files is None:
+            self.setFiles()
+        return self.files
+
+
+    def displayInfo(self):
+        """print meta information on screen"""
+        info = self.getGlobals()
+        start, end = self.getTestTime()
+        rows = [("file name", self.dataFileName),
+                ("raw file", info['fileName']),
+                ("device", info['device']),
+                ("start", str(datetime.datetime.fromtimestamp(info['dateTime'])) if info['dateTime'] else ""),
+                ("cell", "full cell" if self.getIsFullCell() else "half cell"),
+                ("files", self.getFiles()),
+                ("file size", info['fileSize']),
+                ("data points", self.getPoints()),
+                ("cycles", "%d (%d half cycles)" % (self.getCycles(), self.getHalfCycles())),
+                ("test time", "%.2f h" % ((end - start) / 3.6e3)),
+                ("mass", "%s mg" % (info['mass'] or 0)),
+                ("capacity", "%s mAh/g" % (info['capacity'] or 0)),
+                ("area", "%s cm²" % (info['area'] or 0)),
+                ("volume", "%s µL" % (info['volume'] or 0))]
+        width = max(len(x[0]) for x in rows)
+        for name, value in rows:
+            print("%-*s  %s" % (width + 1, name + ":", value))
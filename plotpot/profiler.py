@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import sys, os
+import time
+from contextlib import contextmanager
+
+
+class Profiler(object):
+    """class for recording the time spent in sqlite, numpy conversion and
+       plotting"""
+
+    # modules skipped when looking for the caller of a query
+    skipFiles = ('dbmanager.py', 'profiler.py', 'contextlib.py')
+
+    def __init__(self):
+        self.queries = {}
+        self.cursors = {}
+        self.sections = {}
+
+
+    def getCaller(self):
+        """return class and method name of the code that sent the query"""
+        frame = sys._getframe(1)
+        while frame and os.path.basename(frame.f_code.co_filename) in self.skipFiles:
+            frame = frame.f_back
+        if frame is None:
+            return "unknown"
+        obj = frame.f_locals.get('self')
+        if obj is None:
+            return frame.f_code.co_name
+        return "%s.%s" % (type(obj).__name__, frame.f_code.co_name)
+
+
+    def setQuery(self, cur, sql, elapsed):
+        """record execution time of a statement"""
+        key = (self.getCaller(), " ".join(sql.split()))
+        record = self.queries.get(key)
+        if record is None:
+            record = {'calls': 0, 'execute': 0.0, 'fetch': 0.0, 'convert': 0.0,
+                      'rows': 0, 'bytes': 0}
+            self.queries[key] = record
+        record['calls'] += 1
+        record['execute'] += elapsed
+        self.cursors[id(cur)] = record
+
+
+    def setRows(self, cur, rows, elapsed):
+        """record rows fetched as Python tuples from the last statement"""
+        record = self.cursors.get(id(cur))
+        if record is None or rows is None:
+            return
+        if isinstance(rows, tuple):
+            rows = [rows]
+        record['fetch'] += elapsed
+        record['rows'] += len(rows)
+        record['bytes'] += sum(sys.getsizeof(x) + sum(sys.getsizeof(y) for y in x) for x in rows)
+
+
+    def setBlock(self, cur, block, fetch, convert):
+        """record a numpy block fetched from the last statement"""
+        record = self.cursors.get(id(cur))
+        if record is None:
+            return
+        record['fetch'] += fetch
+        record['convert'] += convert
+        record['rows'] += len(block)
+        record['bytes'] += block.nbytes
+
+
+    @contextmanager
+    def section(self, name):
+        """record wall time of a program section"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sections[name] = self.sections.get(name, 0.0) + time.perf_counter() - start
+
+
+    def printSummary(self):
+        """print recorded timings on screen"""
+        print("*** Profile ***")
+        for name, elapsed in self.sections.items():
+            print("%-20s %9.3f s" % (name, elapsed))
+
+        total = {'execute': 0.0, 'fetch': 0.0, 'convert': 0.0}
+        print("%-40s %5s %10s %10s %9s %9s %9s  %s" % ("caller", "calls", "rows", "MB",
+              "execute", "fetch", "convert", "statement"))
+        for (caller, sql), r in sorted(self.queries.items(), key=lambda x:
+                                       -(x[1]['execute'] + x[1]['fetch'] + x[1]['convert'])):
+            print("%-40s %5d %10d %10.2f %9.3f %9.3f %9.3f  %s" % (caller, r['calls'], r['rows'],
+                  r['bytes'] / 2**20, r['execute'], r['fetch'], r['convert'], sql[:60]))
+            for x in total:
+                total[x] += r[x]
+        print("sqlite execute %.3f s, sqlite fetch %.3f s, numpy conversion %.3f s" %
+              (total['execute'], total['fetch'], total['convert']))
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from multiprocessing import shared_memory
+
+
+class Snapshot(object):
+    """class for a picklable copy of the battery or electrode values the
+       figures depend on. The getters are called once and their results are
+       returned by getters of the same name. Arrays are copied into one block
+       of shared memory by share(), a pickled snapshot only holds the name of
+       the block and the position of each array. Worker processes map the
+       arrays without copying them."""
+
+    # arrays in the shared block start at multiples of the alignment
+    alignment = 64
+
+    def __init__(self, source, getters, electrodes=(None, None)):
+        self.values = {x: getattr(source, x)() for x in getters}
+        self.globalArgs = getattr(source, 'globalArgs', None)
+        self.we, self.ce = electrodes
+        self.memory = None
+        self.shared = {}
+        self.arrays = {}
+
+
+    def __getattr__(self, name):
+        """return getter of a stored value"""
+        values = self.__dict__.get('values', {})
+        shared = self.__dict__.get('shared', {})
+        if name in values or name in shared:
+            return lambda: self.getValue(name)
+        raise AttributeError(name)
+
+
+    def __getstate__(self):
+        """arrays are mapped again after unpickling"""
+        state = self.__dict__.copy()
+        state['arrays'] = {}
+        return state
+
+
+    def getValue(self, name):
+        """return value of getter name, shared arrays are mapped on first access"""
+        if name in self.values:
+            return self.values[name]
+        if name not in self.arrays:
+            offset, shape, dtype = self.shared[name]
+            self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=self.memory.buf, offset=offset)
+        return self.arrays[name]
+
+
+    def getSnapshots(self):
+        """return snapshot and snapshots of the electrodes"""
+        return [x for x in [self, self.we, self.ce] if x is not None]
+
+
+    def share(self):
+        """move arrays of the snapshot and its electrodes into one block of
+           shared memory"""
+        arrays = [(s, name, np.ascontiguousarray(value)) for s in self.getSnapshots()
+                  for name, value in s.values.items() if isinstance(value, np.ndarray)]
+        sizes = [-(-x[2].nbytes // self.alignment) * self.alignment for x in arrays]
+        offsets = np.cumsum([0] + sizes)
+        self.memory = shared_memory.SharedMemory(create=True, size=max(int(offsets[-1]), 1))
+        for (s, name, value), offset in zip(arrays, offsets):
+            np.ndarray(value.shape, dtype=value.dtype, buffer=self.memory.buf, offset=offset)[...] = value
+            s.shared[name] = (int(offset), value.shape, value.dtype.str)
+            s.memory = self.memory
+            del s.values[name]
+
+
+    def close(self):
+        """release mapped arrays and the shared memory block"""
+        for s in self.getSnapshots():
+            s.arrays.clear()
+        if self.memory is not None:
+            self.memory.close()
+
+
+    def unlink(self):
+        """free the shared memory block, called by the owner when all
+           workers are done"""
+        self.close()
+        if self.memory is not None:
+            self.memory.unlink()
+            self.memory = None
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import numpy as np
+
+# own modules
+from plotpot.fingerprint import Fingerprint
+
+
+class Store(object):
+    """class for the memory mapped column store of a data file. Each column
+       of Channel_Normal_Table and the cycle limits of Full_Cycle_Table and
+       Half_Cycle_Table are kept as numpy files in the folder <name>.plotpot
+       next to the data file."""
+
+    manifestFile = "manifest.json"
+
+    def __init__(self, db, identity):
+        self.storePath = os.path.splitext(db)[0] + '.plotpot'
+        self.identity = identity
+        self.setIsValid()
+
+
+    def setIsValid(self):
+        """test if store exists and was created from the current data file"""
+        try:
+            with open(os.path.join(self.storePath, self.manifestFile), "r") as fh:
+                self.manifest = json.load(fh)
+        except (OSError, ValueError):
+            self.manifest = None
+        self.isValid = self.manifest == self.identity
+
+
+    def getIsValid(self):
+        """return boolean if store is up-to-date"""
+        return self.isValid
+
+
+    def getIsAppended(self):
+        """return True if the store is out of date only because data was
+           appended to the raw file"""
+        if self.isValid or not self.manifest or len(self.manifest) < 3 or len(self.identity) < 3:
+            return False
+        return Fingerprint.getIsAppended(self.manifest[2], self.identity[2])
+
+
+    def getFingerprint(self):
+        """return fingerprint of the raw file the store belongs to"""
+        return self.identity[2] if len(self.identity) > 2 else None
+
+
+    def getManifestPoints(self):
+        """return number of data points the store was created with"""
+        return self.manifest[1]
+
+
+    def getStorePath(self):
+        """return store path"""
+        return self.storePath
+
+
+    def getColumn(self, table, column):
+        """return memory mapped column or None if the column is missing"""
+        try:
+            return np.load(os.path.join(self.storePath, "%s.%s.npy" % (table, column)), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+
+    def createColumn(self, table, column, dtype, rows):
+        """create memory mapped column for writing"""
+        return np.lib.format.open_memmap(os.path.join(self.storePath, "%s.%s.npy" % (table, column)),
+                                         mode='w+', dtype=dtype, shape=(rows,))
+
+
+    def resizeColumn(self, table, column, rows):
+        """grow column to rows in place and return it memory mapped for
+           writing, None if the header has no space for the new shape"""
+        path = os.path.join(self.storePath, "%s.%s.npy" % (table, column))
+        try:
+            with open(path, "r+b") as fh:
+                version = np.lib.format.read_magic(fh)
+                if version != (1, 0):
+                    return None
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(fh)
+                offset = fh.tell()
+                fh.seek(0)
+                np.lib.format.write_array_header_1_0(fh, {'descr': np.lib.format.dtype_to_descr(dtype),
+                                                          'fortran_order': fortran,
+                                                          'shape': (rows,)})
+                if fh.tell() != offset:
+                    return None
+                fh.truncate(offset + rows * dtype.itemsize)
+        except (OSError, ValueError):
+            return None
+        return np.load(path, mmap_mode='r+')
+
+
+    def invalidate(self):
+        """remove manifest before the columns are rewritten"""
+        os.makedirs(self.storePath, exist_ok=True)
+        try:
+            os.remove(os.path.join(self.storePath, self.manifestFile))
+        except FileNotFoundError:
+            pass
+        self.isValid = False
+
+
+    def setManifest(self):
+        """mark store as complete"""
+        with open(os.path.join(self.storePath, self.manifestFile), "w") as fh:
+            json.dump(self.identity, fh)
+        self.isValid = True